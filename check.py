@@ -4,6 +4,7 @@
 # Modifications: Split into standalone utility
 
 from ext4 import Volume, MagicError, ext4_superblock
+from image_io import open_image
 import sys, os
 
 # Force UTF-8 on stdout/stderr so non-ASCII volume names don't crash the Windows console.
@@ -39,7 +40,7 @@ def check_ext4(img_path):
         return
 
     try:
-        with open(img_path, "rb") as f:
+        with open_image(img_path) as f:
             vol = Volume(f)
             sb = vol.superblock
 
@@ -75,7 +76,7 @@ def check_ext4_magic(img_path):
       "EXT4" / "EXT3" / "EXT2" / "" (kalau bukan EXT)
     """
     try:
-        with open(img_path, "rb") as f:
+        with open_image(img_path) as f:
             vol = Volume(f)
             sb = vol.superblock
 
@@ -4,11 +4,18 @@
 # Modifications: Split into standalone utility
 
 # pylint: disable=line-too-long
+from bisect import bisect_right
+from collections import OrderedDict
 import ctypes
 from functools import cmp_to_key
 import io
 from math import log as log_math
+import mmap
+import os
 import queue
+import stat
+import struct
+import threading
 
 
 def wcs_cmp(str_a, str_b):
@@ -36,19 +43,29 @@ class MagicError(Ext4Error):
 # ----------------------------- LOW LEVEL ------------------------------
 
 class ext4_struct(ctypes.LittleEndianStructure):
-    def __getattr__(self, name):
-        try:
-            # Combining *_lo and *_hi fields
-            lo_field = ctypes.LittleEndianStructure.__getattribute__(type(self), name + "_lo")
-            size = lo_field.size
+    _split_fields = {}  # (struct type, name) -> (lo field, hi field, shift) or None
 
-            lo = lo_field.__get__(self)
-            hi = ctypes.LittleEndianStructure.__getattribute__(self, name + "_hi")
+    @classmethod
+    def _split_field(cls, name):
+        # Combined *_lo/*_hi fields are looked up once per struct type and name
+        try:
+            return ext4_struct._split_fields[cls, name]
+        except KeyError:
+            lo_field = getattr(cls, name + "_lo", None)
+            hi_field = getattr(cls, name + "_hi", None)
+            split_field = (lo_field, hi_field, 8 * lo_field.size) if lo_field is not None and hi_field is not None else None
+            ext4_struct._split_fields[cls, name] = split_field
+            return split_field
 
-            return (hi << (8 * size)) | lo
-        except AttributeError:
+    def __getattr__(self, name):
+        # Combining *_lo and *_hi fields
+        split_field = type(self)._split_field(name)
+        if split_field is None:
             return ctypes.LittleEndianStructure.__getattribute__(self, name)
 
+        lo_field, hi_field, shift = split_field
+        return (hi_field.__get__(self) << shift) | lo_field.__get__(self)
+
     def __setattr__(self, name, value):
         try:
             # Combining *_lo and *_hi fields
@@ -73,11 +90,13 @@ class ext4_dir_entry_2(ext4_struct):
     @staticmethod
     def _from_buffer_copy(raw, offset=0, platform64=True):
         struct = ext4_dir_entry_2.from_buffer_copy(raw, offset)
-        struct.name = raw[offset + 0x8: offset + 0x8 + struct.name_len]
+        struct.name = bytes(raw[offset + 0x8: offset + 0x8 + struct.name_len])
         return struct
 
 
 class ext4_extent(ext4_struct):
+    EXT_INIT_MAX_LEN = 0x8000  # ee_len above this marks an uninitialized (preallocated) extent
+
     _fields_ = [
         ("ee_block", ctypes.c_uint),  # 0x0000
         ("ee_len", ctypes.c_ushort),  # 0x0004
@@ -106,6 +125,11 @@ class ext4_extent_idx(ext4_struct):
 
 
 class ext4_group_descriptor(ext4_struct):
+    # bg_flags
+    EXT4_BG_INODE_UNINIT = 0x1  # Inode table and bitmap are not initialized
+    EXT4_BG_BLOCK_UNINIT = 0x2  # Block bitmap is not initialized
+    EXT4_BG_INODE_ZEROED = 0x4  # Inode table is zeroed
+
     _fields_ = [
         ("bg_block_bitmap_lo", ctypes.c_uint),  # 0x0000
         ("bg_inode_bitmap_lo", ctypes.c_uint),  # 0x0004
@@ -179,6 +203,7 @@ class ext4_inode(ext4_struct):
     S_IFSOCK = 0xC000  # Socket
 
     # i_flags
+    EXT4_ENCRYPT_FL = 0x800  # Encrypted inode
     EXT4_INDEX_FL = 0x1000  # Uses hash trees
     EXT4_EXTENTS_FL = 0x80000  # Uses extents
     EXT4_EA_INODE_FL = 0x200000  # Inode stores large xattr
@@ -229,6 +254,17 @@ class ext4_superblock(ext4_struct):
     INCOMPAT_32BIT = 0x66
 
     INCOMPAT_FILETYPE = 0x2  # Directory entries record file type (instead of inode flags)
+    INCOMPAT_META_BG = 0x10  # Group descriptor blocks are spread over meta block groups (from s_first_meta_bg on)
+    INCOMPAT_FLEX_BG = 0x200  # Bitmaps and inode tables are packed together; their locations come from the descriptors
+    # s_feature_compat
+    COMPAT_SPARSE_SUPER2 = 0x200  # Superblock backups only in the groups listed in s_backup_bgs
+    # s_feature_ro_compat
+    RO_COMPAT_SPARSE_SUPER = 0x1  # Superblock backups only in groups 0, 1 and powers of 3, 5 and 7
+    RO_COMPAT_GDT_CSUM = 0x10  # Group descriptors have checksums (bg_itable_unused is valid)
+    RO_COMPAT_METADATA_CSUM = 0x400  # Metadata checksums (implies valid bg_itable_unused)
+    # s_flags
+    EXT2_FLAGS_SIGNED_HASH = 0x1  # Directory hashes computed with signed chars
+    EXT2_FLAGS_UNSIGNED_HASH = 0x2  # Directory hashes computed with unsigned chars
     _fields_ = [
         ("s_inodes_count", ctypes.c_uint),  # 0x0000
         ("s_blocks_count_lo", ctypes.c_uint),  # 0x0004
@@ -396,7 +432,7 @@ class ext4_xattr_entry(ext4_struct):
     @staticmethod
     def _from_buffer_copy(raw, offset=0, platform64=True):
         struct = ext4_xattr_entry.from_buffer_copy(raw, offset)
-        struct.e_name = raw[offset + 0x10: offset + 0x10 + struct.e_name_len]
+        struct.e_name = bytes(raw[offset + 0x10: offset + 0x10 + struct.e_name_len])
         return struct
 
     @property
@@ -432,6 +468,228 @@ class InodeType:
     CHECKSUM = 0xDE  # Checksum entry; not really a file type, but a type of directory entry
 
 
+# ----------------------------- DIRECTORY HASHES ------------------------------
+
+class DxHash:
+    LEGACY = 0x0
+    HALF_MD4 = 0x1
+    TEA = 0x2
+    LEGACY_UNSIGNED = 0x3
+    HALF_MD4_UNSIGNED = 0x4
+    TEA_UNSIGNED = 0x5
+    SIPHASH = 0x6  # Casefolded directories, not supported
+
+    DEFAULT_SEED = (0x67452301, 0xEFCDAB89, 0x98BADCFE, 0x10325476)
+    EOF_32BIT = 0x7FFFFFFF
+
+    @staticmethod
+    def _str2hashbuf(name, length, num, signed):
+        # Packs (up to num * 4 bytes of) the name into num words, padded with the remaining length
+        pad = length | (length << 8)
+        pad = (pad | (pad << 16)) & 0xFFFFFFFF
+
+        buf = []
+        val = pad
+        for i, char in enumerate(name[:num * 4]):
+            if signed and char >= 0x80:
+                char -= 0x100
+            val = (char + (val << 8)) & 0xFFFFFFFF
+            if i % 4 == 3:
+                buf.append(val)
+                val = pad
+
+        if len(buf) < num:
+            buf.append(val)
+        buf += [pad] * (num - len(buf))
+        return buf
+
+    @staticmethod
+    def _legacy(name, signed):
+        hash0, hash1 = 0x12A3FE2D, 0x37ABE8F9
+        for char in name:
+            if signed and char >= 0x80:
+                char -= 0x100
+            value = (hash1 + (hash0 ^ ((char * 7152373) & 0xFFFFFFFF))) & 0xFFFFFFFF
+            if value & 0x80000000:
+                value = (value - 0x7FFFFFFF) & 0xFFFFFFFF
+            hash0, hash1 = value, hash0
+        return (hash0 << 1) & 0xFFFFFFFF
+
+    @staticmethod
+    def _half_md4_transform(buf, words):
+        mask = 0xFFFFFFFF
+        rol = lambda x, n: ((x << n) | (x >> (32 - n))) & mask
+        f = lambda x, y, z: z ^ (x & (y ^ z))
+        g = lambda x, y, z: ((x & y) + ((x ^ y) & z)) & mask
+        h = lambda x, y, z: x ^ y ^ z
+
+        a, b, c, d = buf
+        for func, k, rounds in (
+                (f, 0, ((0, 3), (1, 7), (2, 11), (3, 19), (4, 3), (5, 7), (6, 11), (7, 19))),
+                (g, 0o13240474631, ((1, 3), (3, 5), (5, 9), (7, 13), (0, 3), (2, 5), (4, 9), (6, 13))),
+                (h, 0o15666365641, ((3, 3), (7, 9), (2, 11), (6, 15), (1, 3), (5, 9), (0, 11), (4, 15)))):
+            # ROUND(func, a, b, c, d, ...), ROUND(func, d, a, b, c, ...), ...: rotating the names keeps every pass in order
+            for word_idx, shift in rounds:
+                a, b, c, d = d, rol((a + func(b, c, d) + words[word_idx] + k) & mask, shift), b, c
+
+        return [(buf[0] + a) & mask, (buf[1] + b) & mask, (buf[2] + c) & mask, (buf[3] + d) & mask]
+
+    @staticmethod
+    def _tea_transform(buf, words):
+        mask = 0xFFFFFFFF
+        b0, b1 = buf[0], buf[1]
+        a, b, c, d = words
+        total = 0
+        for _ in range(16):
+            total = (total + 0x9E3779B9) & mask
+            b0 = (b0 + ((((b1 << 4) + a) & mask) ^ ((b1 + total) & mask) ^ (((b1 >> 5) + b) & mask))) & mask
+            b1 = (b1 + ((((b0 << 4) + c) & mask) ^ ((b0 + total) & mask) ^ (((b0 >> 5) + d) & mask))) & mask
+
+        return [(buf[0] + b0) & mask, (buf[1] + b1) & mask, buf[2], buf[3]]
+
+    @staticmethod
+    def hash(name, hash_version, seed=None):
+        # Major hash of a raw file name, as stored in dx_entry.hash
+        buf = list(seed) if seed and any(seed) else list(DxHash.DEFAULT_SEED)
+
+        if hash_version in (DxHash.LEGACY, DxHash.LEGACY_UNSIGNED):
+            name_hash = DxHash._legacy(name, hash_version == DxHash.LEGACY)
+        elif hash_version in (DxHash.HALF_MD4, DxHash.HALF_MD4_UNSIGNED):
+            for i in range(0, len(name), 32):
+                buf = DxHash._half_md4_transform(buf, DxHash._str2hashbuf(name[i:], len(name) - i, 8, hash_version == DxHash.HALF_MD4))
+            name_hash = buf[1]
+        elif hash_version in (DxHash.TEA, DxHash.TEA_UNSIGNED):
+            for i in range(0, len(name), 16):
+                buf = DxHash._tea_transform(buf, DxHash._str2hashbuf(name[i:], len(name) - i, 4, hash_version == DxHash.TEA))
+            name_hash = buf[0]
+        else:
+            raise Ext4Error(f"Unsupported directory hash version {hash_version:d}")
+
+        name_hash &= ~1
+        if name_hash == DxHash.EOF_32BIT << 1:
+            name_hash = (DxHash.EOF_32BIT - 1) << 1
+        return name_hash
+
+
+# ----------------------------- PARSERS ------------------------------
+
+class CtypesParser:
+    # Directory entries, extent tree nodes and xattr entries decoded through the ctypes structures
+
+    @staticmethod
+    def dir_entries(raw_data, platform64=True):
+        # (raw name, inode index, file type) of each directory entry
+        offset = 0
+        while offset < len(raw_data):
+            dirent = ext4_dir_entry_2._from_buffer_copy(raw_data, offset, platform64=platform64)
+
+            if dirent.rec_len == 0:
+                # Corrupted entry, the directory would never end
+                break
+
+            yield dirent.name, dirent.inode, dirent.file_type
+            offset += dirent.rec_len
+
+    @staticmethod
+    def extent_header(node):
+        # (eh_magic, eh_entries, eh_depth)
+        header = Volume.struct_from_raw(ext4_extent_header, node)
+        return header.eh_magic, header.eh_entries, header.eh_depth
+
+    @staticmethod
+    def extent_indices(node, count):
+        # Child node block of each ext4_extent_idx
+        indices = Volume.struct_from_raw(ext4_extent_idx * count, node, ctypes.sizeof(ext4_extent_header))
+        return [idx.ei_leaf for idx in indices]
+
+    @staticmethod
+    def extent_leaves(node, count):
+        # (ee_block, ee_len, ee_start) of each ext4_extent
+        extents = Volume.struct_from_raw(ext4_extent * count, node, ctypes.sizeof(ext4_extent_header))
+        return [(extent.ee_block, extent.ee_len, extent.ee_start) for extent in extents]
+
+    @staticmethod
+    def xattr_entries(raw_data, platform64=True):
+        # (e_name_index, e_name, e_value_offs, e_value_inum, e_value_size) up to the end of the list
+        i = 0
+        while i < len(raw_data):
+            xattr_entry = ext4_xattr_entry._from_buffer_copy(raw_data, i, platform64=platform64)
+
+            if not (xattr_entry.e_name_len | xattr_entry.e_name_index | xattr_entry.e_value_offs | xattr_entry.e_value_inum):
+                # End of ext4_xattr_entry list
+                break
+
+            yield xattr_entry.e_name_index, xattr_entry.e_name, xattr_entry.e_value_offs, xattr_entry.e_value_inum, xattr_entry.e_value_size
+            i += xattr_entry._size
+
+
+class StructParser:
+    # Same results as CtypesParser, decoded with precompiled struct.Struct objects (no ctypes instance per record)
+    DIR_ENTRY = struct.Struct("<IHBB")  # inode, rec_len, name_len, file_type
+    EXTENT_HEADER = struct.Struct("<HHHHI")  # eh_magic, eh_entries, eh_max, eh_depth, eh_generation
+    EXTENT_IDX = struct.Struct("<IIHH")  # ei_block, ei_leaf_lo, ei_leaf_hi, ei_unused
+    EXTENT = struct.Struct("<IHHI")  # ee_block, ee_len, ee_start_hi, ee_start_lo
+    XATTR_ENTRY = struct.Struct("<BBHIII")  # e_name_len, e_name_index, e_value_offs, e_value_inum, e_value_size, e_hash
+
+    @staticmethod
+    def dir_entries(raw_data, platform64=True):
+        unpack_from = StructParser.DIR_ENTRY.unpack_from
+
+        offset = 0
+        while offset < len(raw_data):
+            inode_idx, rec_len, name_len, file_type = unpack_from(raw_data, offset)
+
+            if rec_len == 0:
+                # Corrupted entry, the directory would never end
+                break
+
+            yield bytes(raw_data[offset + 0x8: offset + 0x8 + name_len]), inode_idx, file_type
+            offset += rec_len
+
+    @staticmethod
+    def extent_header(node):
+        eh_magic, eh_entries, _, eh_depth, _ = StructParser.EXTENT_HEADER.unpack_from(node)
+        return eh_magic, eh_entries, eh_depth
+
+    @staticmethod
+    def _extent_entries(structure, node, count):
+        raw = node[StructParser.EXTENT_HEADER.size: StructParser.EXTENT_HEADER.size + count * structure.size]
+        if len(raw) != count * structure.size:
+            raise ValueError(f"Extent node holds less than {count:d} entries")
+        return structure.iter_unpack(raw)
+
+    @staticmethod
+    def extent_indices(node, count):
+        return [(ei_leaf_hi << 32) | ei_leaf_lo
+                for _, ei_leaf_lo, ei_leaf_hi, _ in StructParser._extent_entries(StructParser.EXTENT_IDX, node, count)]
+
+    @staticmethod
+    def extent_leaves(node, count):
+        return [(ee_block, ee_len, (ee_start_hi << 32) | ee_start_lo)
+                for ee_block, ee_len, ee_start_hi, ee_start_lo in StructParser._extent_entries(StructParser.EXTENT, node, count)]
+
+    @staticmethod
+    def xattr_entries(raw_data, platform64=True):
+        unpack_from = StructParser.XATTR_ENTRY.unpack_from
+
+        i = 0
+        while i < len(raw_data):
+            e_name_len, e_name_index, e_value_offs, e_value_inum, e_value_size, _ = unpack_from(raw_data, i)
+
+            if not (e_name_len | e_name_index | e_value_offs | e_value_inum):
+                # End of ext4_xattr_entry list
+                break
+
+            yield e_name_index, bytes(raw_data[i + 0x10: i + 0x10 + e_name_len]), e_value_offs, e_value_inum, e_value_size
+            i += 4 * ((StructParser.XATTR_ENTRY.size + e_name_len + 3) // 4)  # 4-byte alignment
+
+
+PARSERS = {
+    "ctypes": CtypesParser,
+    "struct": StructParser,
+}
+
+
 # ----------------------------- HIGH LEVEL ------------------------------
 
 class MappingEntry:
@@ -466,41 +724,318 @@ class MappingEntry:
     def optimize(entries):
         entries.sort(key=lambda entry: entry.file_block_idx)
 
-        idx = 0
-        while idx < len(entries):
-            while idx + 1 < len(entries) \
-                    and entries[idx].file_block_idx + entries[idx].block_count == entries[idx + 1].file_block_idx \
-                    and entries[idx].disk_block_idx + entries[idx].block_count == entries[idx + 1].disk_block_idx:
-                tmp = entries.pop(idx + 1)
-                entries[idx].block_count += tmp.block_count
+        # Merge runs that are contiguous both in the file and on disk (single pass)
+        merged = []
+        for entry in entries:
+            if merged \
+                    and merged[-1].file_block_idx + merged[-1].block_count == entry.file_block_idx \
+                    and merged[-1].disk_block_idx + merged[-1].block_count == entry.disk_block_idx:
+                merged[-1].block_count += entry.block_count
+            else:
+                merged.append(entry)
+
+        entries[:] = merged
+
+
+class BlockCache:
+    def __init__(self, max_blocks, block_size):
+        self.max_blocks = max_blocks
+        self.block_size = block_size
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        self._blocks = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._blocks)
+
+    def __repr__(self):
+        return f"{type(self).__name__:s}(max_blocks = {self.max_blocks!r:s}, hits = {self.hits!r:s}, misses = {self.misses!r:s}, evictions = {self.evictions!r:s})"
+
+    @property
+    def bytes_saved(self):
+        return self.hits * self.block_size
+
+    @property
+    def hit_rate(self):
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def get(self, block_idx):
+        with self._lock:
+            block = self._blocks.get(block_idx)
+            if block is None:
+                self.misses += 1
+            else:
+                self._blocks.move_to_end(block_idx)
+                self.hits += 1
+            return block
+
+    def put(self, block_idx, block):
+        with self._lock:
+            self._blocks[block_idx] = block
+            self._blocks.move_to_end(block_idx)
+            while len(self._blocks) > self.max_blocks:
+                self._blocks.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._blocks.clear()
+
+    def stats(self):
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "bytes_saved": self.bytes_saved,
+            "hit_rate": self.hit_rate,
+            "cached_blocks": len(self._blocks),
+        }
+
 
-            idx += 1
+class DentryCache:
+    MISSING = object()  # Returned by get() when nothing is cached for the name (None is a cached negative entry)
+
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+
+        self.hits = 0
+        self.negative_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __repr__(self):
+        return f"{type(self).__name__:s}(max_entries = {self.max_entries!r:s}, hits = {self.hits!r:s}, negative_hits = {self.negative_hits!r:s}, misses = {self.misses!r:s}, evictions = {self.evictions!r:s})"
+
+    @property
+    def hit_rate(self):
+        total = self.hits + self.negative_hits + self.misses
+        return (self.hits + self.negative_hits) / total if total else 0.0
+
+    def get(self, parent_inode_idx, name):
+        # (inode index, file type) of the child, None if it is known not to exist, DentryCache.MISSING otherwise
+        key = (parent_inode_idx, name)
+        with self._lock:
+            entry = self._entries.get(key, DentryCache.MISSING)
+            if entry is DentryCache.MISSING:
+                self.misses += 1
+            else:
+                self._entries.move_to_end(key)
+                if entry is None:
+                    self.negative_hits += 1
+                else:
+                    self.hits += 1
+            return entry
+
+    def put(self, parent_inode_idx, name, entry):
+        key = (parent_inode_idx, name)
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        return {
+            "hits": self.hits,
+            "negative_hits": self.negative_hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": self.hit_rate,
+            "cached_entries": len(self._entries),
+        }
+
+
+class GroupDescriptorTable:
+    # Sequence of group descriptors; the descriptor blocks are fetched with as few reads as possible on first
+    # access and every descriptor is only decoded when it is asked for
+
+    def __init__(self, volume, group_count, backup_bgs=(0, 0)):
+        self.volume = volume
+        self.group_count = group_count
+        self.backup_bgs = backup_bgs
+
+        self.reads = 0
+
+        self._raw = None
+        self._descriptors = [None] * group_count
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return self.group_count
+
+    def __repr__(self):
+        return f"{type(self).__name__:s}(group_count = {self.group_count!r:s}, loaded = {self._raw is not None!r:s}, reads = {self.reads!r:s})"
+
+    def __iter__(self):
+        for group_idx in range(self.group_count):
+            yield self[group_idx]
+
+    def __getitem__(self, group_idx):
+        if group_idx < 0:
+            group_idx += self.group_count
+        if not 0 <= group_idx < self.group_count:
+            raise IndexError(f"Group descriptor index {group_idx:d} out of range (volume has {self.group_count:d} groups)")
+
+        descriptor = self._descriptors[group_idx]
+        if descriptor is None:
+            desc_size = self.volume.superblock.s_desc_size
+            raw = self._load()[group_idx * desc_size: (group_idx + 1) * desc_size]
+            raw = bytes(raw).ljust(ctypes.sizeof(ext4_group_descriptor), b"\0")
+            descriptor = ext4_group_descriptor._from_buffer_copy(raw, platform64=self.volume.platform64)
+            self._descriptors[group_idx] = descriptor
+        return descriptor
+
+    def _load(self):
+        with self._lock:
+            if self._raw is None:
+                self._raw = self._read_table()
+            return self._raw
+
+    def _read_table(self):
+        volume = self.volume
+        superblock = volume.superblock
+        block_size = volume.block_size
+
+        desc_block_count = -(-self.group_count * superblock.s_desc_size // block_size)
+        desc_block_locations = [self.desc_block_location(desc_block_idx) for desc_block_idx in range(desc_block_count)]
+
+        # Without meta_bg the whole table is one run of blocks right after the superblock
+        raw = bytearray()
+        run_start = run_length = 0
+        for block_idx in desc_block_locations + [None]:
+            if run_length and block_idx == run_start + run_length:
+                run_length += 1
+                continue
+            if run_length:
+                data = volume.read(run_start * block_size, run_length * block_size)
+                if len(data) != run_length * block_size:
+                    raise EndOfStreamError(f"The volume's underlying stream ended {run_length * block_size - len(data):d} bytes before EOF.")
+                raw += data
+                self.reads += 1
+            run_start, run_length = block_idx, 1
+        return raw
+
+    def desc_block_location(self, desc_block_idx):
+        superblock = self.volume.superblock
+        first_data_block = superblock.s_first_data_block
+
+        if (superblock.s_feature_incompat & ext4_superblock.INCOMPAT_META_BG) == 0 or desc_block_idx < superblock.s_first_meta_bg:
+            return first_data_block + 1 + desc_block_idx
+
+        # First block of the meta block group, behind the superblock backup if the group has one
+        group_idx = desc_block_idx * (self.volume.block_size // superblock.s_desc_size)
+        location = first_data_block + group_idx * superblock.s_blocks_per_group
+        if self.has_super(group_idx):
+            location += 1
+        if self.volume.block_size == 1024 and desc_block_idx == 0 and first_data_block == 0:
+            location += 1
+        return location
+
+    def has_super(self, group_idx):
+        superblock = self.volume.superblock
+
+        if group_idx == 0:
+            return True
+        if superblock.s_feature_compat & ext4_superblock.COMPAT_SPARSE_SUPER2:
+            return group_idx in self.backup_bgs
+        if group_idx <= 1 or (superblock.s_feature_ro_compat & ext4_superblock.RO_COMPAT_SPARSE_SUPER) == 0:
+            return True
+        if group_idx % 2 == 0:
+            return False
+        for base in (3, 5, 7):
+            power = base
+            while power < group_idx:
+                power *= base
+            if power == group_idx:
+                return True
+        return False
 
 
 class Volume:
     ROOT_INODE = 2
 
-    def __init__(self, stream, offset=0, ignore_flags=False, ignore_magic=False):
+    def __init__(self, stream, offset=0, ignore_flags=False, ignore_magic=False, use_mmap=False, cache_size=0,
+                 prefetch_inode_tables=False, parser="ctypes", dentry_cache_size=4096, inode_table_cache_size=4):
+        if parser not in PARSERS:
+            raise ValueError(f"Unknown parser {parser!r:s} (expected one of {', '.join(PARSERS):s})")
+
         self.ignore_flags = ignore_flags
         self.ignore_magic = ignore_magic
         self.offset = offset
         self.platform64 = True  # Initial value needed for Volume.read_struct
         self.stream = stream
 
+        # Decoder for directory entries, extent nodes and xattr entries ("ctypes" by default, "struct" is opt-in)
+        self.parser = PARSERS[parser]
+
+        # Memory-mapped image, only available for regular files
+        self._mmap = None
+        self._view = None
+        if use_mmap:
+            self._open_mmap()
+
+        # Positional reads (os.pread) have no shared cursor, so one Volume can serve many threads.
+        # Streams without a usable file descriptor fall back to seek + read under a lock.
+        # raw_fd is also used for kernel-side copies (BlockReader.copy_to), even in mmap mode.
+        self.raw_fd = self._get_pread_fd(stream)
+        self._fd = None if self.is_mmap else self.raw_fd
+        self._lock = threading.Lock()
+
+        self.block_cache = None  # Created once the block size is known
+
+        # (parent inode, name) -> (child inode, file type) of resolved path components, including misses
+        self.dentry_cache = DentryCache(dentry_cache_size) if dentry_cache_size > 0 else None
+
+        # Whole inode tables read with one sequential read per group (pointless on top of mmap). Only the
+        # inode_table_cache_size most recently used groups are kept, a walk mostly stays within a few groups.
+        self.prefetch_inode_tables = prefetch_inode_tables and not self.is_mmap
+        self.inode_table_cache_size = max(1, inode_table_cache_size)
+        self._inode_tables = OrderedDict()
+        self._inode_tables_lock = threading.Lock()
+
         # Superblock
         self.superblock = self.read_struct(ext4_superblock, 0x400)
         self.platform64 = (self.superblock.s_feature_incompat & ext4_superblock.INCOMPAT_64BIT) != 0
 
+        # Feature flags, decoded once instead of per inode
+        self.feature_compat = self.superblock.s_feature_compat
+        self.feature_incompat = self.superblock.s_feature_incompat
+        self.feature_ro_compat = self.superblock.s_feature_ro_compat
+        self.has_filetype = (self.feature_incompat & ext4_superblock.INCOMPAT_FILETYPE) != 0
+        self.inode_size = self.superblock.s_inode_size
+
+        # Directory hash tree parameters and sparse_super2 backup groups (s_flags and s_backup_bgs are read raw,
+        # _from_buffer_copy clears them without INCOMPAT_64BIT)
+        s_flags, = struct.unpack_from("<I", self.read(0x400 + ext4_superblock.s_flags.offset, 4))
+        backup_bgs = struct.unpack_from("<2I", self.read(0x400 + ext4_superblock.s_backup_bgs.offset, 8))
+        self.dx_hash_seed = tuple(self.superblock.s_hash_seed)
+        self.dx_hash_unsigned = (s_flags & ext4_superblock.EXT2_FLAGS_UNSIGNED_HASH) != 0
+
         if not ignore_magic and self.superblock.s_magic != 0xEF53:
             raise MagicError(f"Invalid magic value in superblock: 0x{self.superblock.s_magic:04X} (expected 0xEF53)")
 
-        # Group descriptors
-        self.group_descriptors = [None] * (self.superblock.s_inodes_count // self.superblock.s_inodes_per_group)
+        # LRU cache of whole disk blocks for small (metadata) reads; pointless on top of mmap
+        if cache_size > 0 and not self.is_mmap:
+            self.block_cache = BlockCache(max(1, cache_size // self.block_size), self.block_size)
 
-        group_desc_table_offset = (0x400 // self.block_size + 1) * self.block_size  # First block after superblock
-        for group_desc_idx in range(len(self.group_descriptors)):
-            group_desc_offset = group_desc_table_offset + group_desc_idx * self.superblock.s_desc_size
-            self.group_descriptors[group_desc_idx] = self.read_struct(ext4_group_descriptor, group_desc_offset)
+        # Group descriptors (read and decoded on first use, so opening a volume only costs the superblock read)
+        self.group_descriptors = GroupDescriptorTable(self, self.superblock.s_inodes_count // self.superblock.s_inodes_per_group, backup_bgs)
 
     def __repr__(self):
         return f"{type(self).__name__:s}(volume_name = {self.superblock.s_volume_name!r:s}, uuid = {self.uuid!r:s}, last_mounted = {self.superblock.s_last_mounted!r:s})"
@@ -546,20 +1081,172 @@ class Volume:
             inode_table_offset = self.group_descriptors[group_idx].bg_inode_table * self.block_size
         except Exception:
             inode_table_offset = 99 * self.block_size
-        inode_offset = inode_table_offset + inode_table_entry_idx * self.superblock.s_inode_size
-
-        return Inode(self, inode_offset, inode_idx, file_type)
+        inode_offset = inode_table_offset + inode_table_entry_idx * self.inode_size
+
+        raw = None
+        if self.prefetch_inode_tables:
+            raw = self._get_inode_table_entry(group_idx, inode_table_entry_idx, inode_table_offset)
+
+        return Inode(self, inode_offset, inode_idx, file_type, raw)
+
+    def _get_inode_table_entry(self, group_idx, inode_table_entry_idx, inode_table_offset):
+        with self._inode_tables_lock:
+            inode_table = self._inode_tables.get(group_idx)
+            if inode_table is not None:
+                self._inode_tables.move_to_end(group_idx)
+
+        if inode_table is None:
+            inode_count = self.superblock.s_inodes_per_group
+            if self.feature_ro_compat & (ext4_superblock.RO_COMPAT_GDT_CSUM | ext4_superblock.RO_COMPAT_METADATA_CSUM):
+                # Only the initialized part of the inode table holds inodes in use
+                try:
+                    inode_count -= self.group_descriptors[group_idx].bg_itable_unused
+                except Exception:
+                    return None
+
+            inode_table = memoryview(bytearray(self.read(inode_table_offset, max(0, inode_count) * self.inode_size)))
+            with self._inode_tables_lock:
+                inode_table = self._inode_tables.setdefault(group_idx, inode_table)
+                self._inode_tables.move_to_end(group_idx)
+                while len(self._inode_tables) > self.inode_table_cache_size:
+                    self._inode_tables.popitem(last=False)
+
+        inode_size = self.inode_size
+        raw = inode_table[inode_table_entry_idx * inode_size: (inode_table_entry_idx + 1) * inode_size]
+        # Inodes beyond the initialized part of the table are read on their own
+        return raw if len(raw) == inode_size else None
 
     def get_inode_group(self, inode_idx):
         group_idx = (inode_idx - 1) // self.superblock.s_inodes_per_group
         inode_table_entry_idx = (inode_idx - 1) % self.superblock.s_inodes_per_group
         return group_idx, inode_table_entry_idx
 
+    def _open_mmap(self):
+        try:
+            # ACCESS_COPY gives a writable (copy-on-write) buffer, which ctypes' from_buffer requires.
+            # Nothing is ever written back to the image.
+            self._mmap = mmap.mmap(self.stream.fileno(), 0, access=mmap.ACCESS_COPY)
+        except (AttributeError, io.UnsupportedOperation, OSError, OverflowError, ValueError):
+            # Not a regular file (pipe, BytesIO, ...), empty or too large to map: keep using the stream
+            self._mmap = None
+            return
+
+        self._view = memoryview(self._mmap)
+
+    @staticmethod
+    def _get_pread_fd(stream):
+        if not hasattr(os, "pread"):
+            return None
+
+        try:
+            fd = stream.fileno()
+            st_mode = os.fstat(fd).st_mode
+        except (AttributeError, io.UnsupportedOperation, OSError, ValueError):
+            return None
+
+        return fd if stat.S_ISREG(st_mode) or stat.S_ISBLK(st_mode) else None
+
+    def close(self):
+        if self._view is not None:
+            self._view.release()
+            self._view = None
+
+        if self._mmap is not None:
+            try:
+                self._mmap.close()
+            except BufferError:
+                # Structures built with from_buffer still reference the mapping; it is released with them
+                pass
+            self._mmap = None
+
+    @property
+    def is_mmap(self):
+        return self._view is not None
+
     def read(self, offset, byte_len):
-        if self.offset + offset != self.stream.tell():
+        if self._view is not None:
+            start = self.offset + offset
+            return self._view[start:start + byte_len]
+
+        if self.block_cache is not None:
+            # Reads contained in a single block are served from the cache, larger reads bypass it
+            block_idx, block_offset = divmod(offset, self.block_size)
+            if block_offset + byte_len <= self.block_size:
+                block = self.block_cache.get(block_idx)
+                if block is None:
+                    block = self._read_raw(block_idx * self.block_size, self.block_size)
+                    self.block_cache.put(block_idx, block)
+                return block[block_offset:block_offset + byte_len]
+
+        return self._read_raw(offset, byte_len)
+
+    def _read_raw(self, offset, byte_len):
+        if self._fd is not None:
+            return self._pread(self.offset + offset, byte_len)
+
+        with self._lock:
+            if self.offset + offset != self.stream.tell():
+                self.stream.seek(self.offset + offset, io.SEEK_SET)
+
+            return self.stream.read(byte_len)
+
+    def _pread(self, position, byte_len):
+        data = os.pread(self._fd, byte_len, position)
+        if len(data) == byte_len or not data:
+            return data
+
+        # Short read (signal, huge request): keep going until EOF or byte_len is satisfied
+        chunks = [data]
+        received = len(data)
+        while received < byte_len:
+            data = os.pread(self._fd, byte_len - received, position + received)
+            if not data:
+                break
+            chunks.append(data)
+            received += len(data)
+
+        return b"".join(chunks)
+
+    def readinto(self, offset, buffer):
+        # Reads len(buffer) bytes at offset straight into buffer, returns the number of bytes read
+        buffer = memoryview(buffer)
+        byte_len = len(buffer)
+
+        if self._view is not None:
+            start = self.offset + offset
+            data = self._view[start:start + byte_len]
+            buffer[:len(data)] = data
+            return len(data)
+
+        if self.block_cache is not None:
+            # Reads contained in a single block (directory blocks, small files) go through the cache like read()
+            if offset % self.block_size + byte_len <= self.block_size:
+                data = self.read(offset, byte_len)
+                buffer[:len(data)] = data
+                return len(data)
+
+        received = 0
+        if self._fd is not None:
+            while received < byte_len:
+                if hasattr(os, "preadv"):
+                    n = os.preadv(self._fd, [buffer[received:]], self.offset + offset + received)
+                else:
+                    data = os.pread(self._fd, byte_len - received, self.offset + offset + received)
+                    n = len(data)
+                    buffer[received:received + n] = data
+                if n == 0:
+                    break
+                received += n
+            return received
+
+        with self._lock:
             self.stream.seek(self.offset + offset, io.SEEK_SET)
-
-        return self.stream.read(byte_len)
+            while received < byte_len:
+                n = self.stream.readinto(buffer[received:])
+                if not n:
+                    break
+                received += n
+        return received
 
     def read_struct(self, structure, offset, platform64=None):
         raw = self.read(offset, ctypes.sizeof(structure))
@@ -567,12 +1254,24 @@ class Volume:
         if hasattr(structure, "_from_buffer_copy"):
             return structure._from_buffer_copy(raw, platform64=platform64 if platform64 else self.platform64)
         else:
-            return structure.from_buffer_copy(raw)
+            return self.struct_from_raw(structure, raw)
+
+    @staticmethod
+    def struct_from_raw(structure, raw, offset=0):
+        if isinstance(raw, memoryview) and not raw.readonly:
+            # Zero-copy: the structure is a view into the mapped image (or a prefetched buffer)
+            return structure.from_buffer(raw, offset)
+        else:
+            return structure.from_buffer_copy(raw, offset)
 
     @property
     def root(self):
         return self.get_inode(Volume.ROOT_INODE, InodeType.DIRECTORY)
 
+    def lookup(self, path):
+        # Inode of an absolute path like "/system/build.prop"; every component goes through the dentry cache
+        return self.root.get_inode(*[part for part in path.split("/") if part])
+
     @property
     def uuid(self):
         uuid = self.superblock.s_uuid
@@ -581,16 +1280,66 @@ class Volume:
 
 
 class Inode:
-    def __init__(self, volume, offset, inode_idx, file_type=InodeType.UNKNOWN):
+    DX_ROOT_INFO = struct.Struct("<IBBBB")  # reserved_zero, hash_version, info_length, indirect_levels, unused_flags
+    DX_COUNT_LIMIT = struct.Struct("<HHI")  # limit, count, block of the first dx_entry
+    DX_ENTRY = struct.Struct("<II")  # hash, block
+
+    __slots__ = ("inode_idx", "offset", "volume", "raw", "inode", "file_type", "mode", "uid", "gid", "size", "flags",
+                 "_mode_str")
+
+    # i_mode & 0xF000 -> InodeType, used when the directory entry carries no file type
+    MODE_TYPES = {
+        ext4_inode.S_IFIFO: InodeType.FIFO,
+        ext4_inode.S_IFCHR: InodeType.CHARACTER_DEVICE,
+        ext4_inode.S_IFDIR: InodeType.DIRECTORY,
+        ext4_inode.S_IFBLK: InodeType.BLOCK_DEVICE,
+        ext4_inode.S_IFREG: InodeType.FILE,
+        ext4_inode.S_IFLNK: InodeType.SYMBOLIC_LINK,
+        ext4_inode.S_IFSOCK: InodeType.SOCKET,
+    }
+
+    TYPE_LETTERS = {
+        InodeType.FILE: "-",
+        InodeType.DIRECTORY: "d",
+        InodeType.CHARACTER_DEVICE: "c",
+        InodeType.BLOCK_DEVICE: "b",
+        InodeType.FIFO: "p",
+        InodeType.SOCKET: "s",
+        InodeType.SYMBOLIC_LINK: "l"
+    }
+
+    def __init__(self, volume, offset, inode_idx, file_type=InodeType.UNKNOWN, raw=None):
         self.inode_idx = inode_idx
         self.offset = offset
         self.volume = volume
 
+        # Raw on-disk inode (s_inode_size bytes); i_block and inline xattrs are decoded from it
+        if raw is None:
+            raw = volume.read(offset, volume.inode_size)
+        self.raw = raw
+
+        if len(raw) < ctypes.sizeof(ext4_inode):
+            # Small (128 byte) inodes have no extra fields
+            self.inode = ext4_inode.from_buffer_copy(bytes(raw) + bytes(ctypes.sizeof(ext4_inode) - len(raw)))
+        else:
+            self.inode = Volume.struct_from_raw(ext4_inode, raw)
+
+        # Hot fields, decoded once
+        self.mode = self.inode.i_mode
+        self.uid = self.inode.i_uid
+        self.gid = self.inode.i_gid
+        self.size = self.inode.i_size
+        self.flags = self.inode.i_flags
+
+        # The directory entry's file type is only trusted with INCOMPAT_FILETYPE, otherwise it comes from i_mode
+        if not volume.has_filetype or file_type == InodeType.UNKNOWN:
+            file_type = Inode.MODE_TYPES.get(self.mode & 0xF000, InodeType.UNKNOWN)
         self.file_type = file_type
-        self.inode = volume.read_struct(ext4_inode, offset)
+
+        self._mode_str = None
 
     def __len__(self):
-        return self.inode.i_size
+        return self.size
 
     def __repr__(self):
         if self.inode_idx is not None:
@@ -611,40 +1360,28 @@ class Inode:
         }
         prefixes.update(prefixes)
 
-        # Iterator over ext4_xattr_entry structures
-        i = 0
-        while i < len(raw_data):
-            xattr_entry = ext4_xattr_entry._from_buffer_copy(raw_data, i, platform64=self.volume.platform64)
-
-            if not (
-                    xattr_entry.e_name_len | xattr_entry.e_name_index | xattr_entry.e_value_offs | xattr_entry.e_value_inum):
-                # End of ext4_xattr_entry list
-                break
-
-            if xattr_entry.e_name_index not in prefixes:
-                raise Ext4Error(f"Unknown attribute prefix {xattr_entry.e_name_index:d} in inode {self.inode_idx:d}")
+        for e_name_index, e_name, e_value_offs, e_value_inum, e_value_size in self.volume.parser.xattr_entries(raw_data, self.volume.platform64):
+            if e_name_index not in prefixes:
+                raise Ext4Error(f"Unknown attribute prefix {e_name_index:d} in inode {self.inode_idx:d}")
 
-            xattr_name = prefixes[xattr_entry.e_name_index] + xattr_entry.e_name.decode("iso-8859-2")
+            xattr_name = prefixes[e_name_index] + e_name.decode("iso-8859-2")
 
-            if xattr_entry.e_value_inum != 0:
+            if e_value_inum != 0:
                 # external xattr
-                xattr_inode = self.volume.get_inode(xattr_entry.e_value_inum, InodeType.FILE)
+                xattr_inode = self.volume.get_inode(e_value_inum, InodeType.FILE)
 
-                if not self.volume.ignore_flags and (xattr_inode.inode.i_flags & ext4_inode.EXT4_EA_INODE_FL) != 0:
+                if not self.volume.ignore_flags and (xattr_inode.flags & ext4_inode.EXT4_EA_INODE_FL) != 0:
                     raise Ext4Error(
                         f"Inode {xattr_inode.inode_idx:d} associated with the extended attribute {xattr_name!r:s} of inode {self.inode_idx:d} is not marked as large extended attribute value.")
 
-                # TODO Use xattr_entry.e_value_size or xattr_inode.inode.i_size?
+                # TODO Use e_value_size or xattr_inode.inode.i_size?
                 xattr_value = xattr_inode.open_read().read()
             else:
                 # internal xattr
-                xattr_value = raw_data[
-                              xattr_entry.e_value_offs + offset: xattr_entry.e_value_offs + offset + xattr_entry.e_value_size]
+                xattr_value = bytes(raw_data[e_value_offs + offset: e_value_offs + offset + e_value_size])
 
             yield xattr_name, xattr_value
 
-            i += xattr_entry._size
-
     @staticmethod
     def directory_entry_comparator(dir_a, dir_b):
         file_name_a, _, file_type_a = dir_a
@@ -667,41 +1404,140 @@ class Inode:
         for i, part in enumerate(relative_path):
             if not self.volume.ignore_flags and not current_inode.is_dir:
                 current_path = "/".join(relative_path[:i])
-                raise Ext4Error(f"{current_path!r:s} (Inode {inode_idx:d}) is not a directory."
+                raise Ext4Error(f"{current_path!r:s} (Inode {current_inode.inode_idx:d}) is not a directory."
                                 )
 
-            file_name, inode_idx, file_type = next(
-                filter(lambda entry: entry[0] == part, current_inode.open_dir(decode_name)), (None, None, None))
+            entry = current_inode.lookup_entry(part, decode_name)
 
-            if inode_idx is None:
+            if entry is None:
                 current_path = "/".join(relative_path[:i])
                 raise FileNotFoundError(
                     f"{part!r:s} not found in {current_path!r:s} (Inode {current_inode.inode_idx:d}).")
 
+            inode_idx, file_type = entry
             current_inode = current_inode.volume.get_inode(inode_idx, file_type)
 
         return current_inode
 
+    def lookup_entry(self, name, decode_name=None):
+        # (inode index, file type) of the entry called name in this directory, None if there is none
+        dentry_cache = self.volume.dentry_cache if decode_name is None and self.inode_idx is not None else None
+
+        if dentry_cache is not None:
+            entry = dentry_cache.get(self.inode_idx, name)
+            if entry is not DentryCache.MISSING:
+                return entry
+
+        # Hash tree lookup reads one block per tree level instead of the whole directory
+        raw_name = name.encode("utf8") if decode_name is None else None
+        leaf_blocks = self._dx_leaf_blocks(raw_name) if raw_name is not None else None
+        if leaf_blocks is not None:
+            entry = next(
+                ((inode_idx, file_type) for leaf_block in leaf_blocks
+                 for entry_name, inode_idx, file_type in self.volume.parser.dir_entries(leaf_block, self.volume.platform64)
+                 if inode_idx != 0 and entry_name == raw_name), None)
+        else:
+            entry = next(
+                ((inode_idx, file_type) for entry_name, inode_idx, file_type in self.open_dir(decode_name)
+                 if entry_name == name), None)
+
+        if dentry_cache is not None:
+            dentry_cache.put(self.inode_idx, name, entry)
+        return entry
+
+    def _dx_leaf_blocks(self, name):
+        # Leaf blocks that may hold the raw name (more than one only on hash collisions),
+        # None if this directory has no usable hash tree
+        if (self.flags & ext4_inode.EXT4_INDEX_FL) == 0 or (self.flags & ext4_inode.EXT4_ENCRYPT_FL) != 0:
+            return None
+
+        reader = self.open_read()
+        if not hasattr(reader, "read_block"):
+            return None
+
+        # dx_root: "." and ".." entries (0x18 bytes), dx_root_info, then the dx_entry array
+        root = reader.read_block(0)
+        reserved_zero, hash_version, info_length, indirect_levels, _ = Inode.DX_ROOT_INFO.unpack_from(root, 0x18)
+        if reserved_zero != 0 or info_length != 8 or indirect_levels > 2:
+            return None
+
+        if name in (b".", b".."):
+            # Not hashed, both live in the dx_root block
+            return [root]
+
+        if hash_version <= DxHash.TEA and self.volume.dx_hash_unsigned:
+            hash_version += DxHash.LEGACY_UNSIGNED
+        if hash_version > DxHash.TEA_UNSIGNED:
+            return None
+        name_hash = DxHash.hash(name, hash_version, self.volume.dx_hash_seed)
+
+        # (dx_entry list, position) for every level from the root down
+        path = [(Inode._dx_entries(root, 0x18 + info_length), None)]
+        while True:
+            entries, _ = path[-1]
+            if not entries:
+                return None
+
+            position = bisect_right([entry_hash for entry_hash, _ in entries], name_hash, 1) - 1
+            path[-1] = (entries, position)
+            if len(path) > indirect_levels:
+                break
+            # dx_node: an empty directory entry spanning the block (8 bytes), then the dx_entry array
+            path.append((Inode._dx_entries(reader.read_block(entries[position][1]), 0x8), None))
+
+        leaf_blocks = [reader.read_block(entries[position][1])]
+
+        # Entries with the same hash may continue in the next leaf, which is then indexed with that hash
+        while True:
+            level = len(path) - 1
+            while level >= 0 and path[level][1] + 1 >= len(path[level][0]):
+                level -= 1
+            if level < 0:
+                break
+
+            entries, position = path[level]
+            if (entries[position + 1][0] & ~1) != name_hash:
+                break
+
+            path[level] = (entries, position + 1)
+            for level in range(level + 1, len(path)):
+                parent_entries, parent_position = path[level - 1]
+                path[level] = (Inode._dx_entries(reader.read_block(parent_entries[parent_position][1]), 0x8), 0)
+                if not path[level][0]:
+                    return None
+
+            entries, position = path[-1]
+            leaf_blocks.append(reader.read_block(entries[position][1]))
+
+        return leaf_blocks
+
+    @staticmethod
+    def _dx_entries(block, offset):
+        # [(hash, block)] of a dx_entry array; the first entry holds limit/count instead of a hash (reads as 0)
+        if len(block) < offset + Inode.DX_COUNT_LIMIT.size:
+            return []
+
+        limit, count, first_block = Inode.DX_COUNT_LIMIT.unpack_from(block, offset)
+        if count == 0 or count > limit or offset + count * Inode.DX_ENTRY.size > len(block):
+            return []
+
+        entries = [(0, first_block & 0x0FFFFFFF)]
+        for i in range(1, count):
+            entry_hash, entry_block = Inode.DX_ENTRY.unpack_from(block, offset + i * Inode.DX_ENTRY.size)
+            entries.append((entry_hash, entry_block & 0x0FFFFFFF))
+        return entries
+
     @property
     def is_dir(self):
-        if (self.volume.superblock.s_feature_incompat & ext4_superblock.INCOMPAT_FILETYPE) == 0:
-            return (self.inode.i_mode & ext4_inode.S_IFDIR) != 0
-        else:
-            return self.file_type == InodeType.DIRECTORY
+        return self.file_type == InodeType.DIRECTORY
 
     @property
     def is_file(self):
-        if (self.volume.superblock.s_feature_incompat & ext4_superblock.INCOMPAT_FILETYPE) == 0:
-            return (self.inode.i_mode & ext4_inode.S_IFREG) != 0
-        else:
-            return self.file_type == InodeType.FILE
+        return self.file_type == InodeType.FILE
 
     @property
     def is_symlink(self):
-        if (self.volume.superblock.s_feature_incompat & ext4_superblock.INCOMPAT_FILETYPE) == 0:
-            return (self.inode.i_mode & ext4_inode.S_IFLNK) != 0
-        else:
-            return self.file_type == InodeType.SYMBOLIC_LINK
+        return self.file_type == InodeType.SYMBOLIC_LINK
 
     @property
     def is_in_use(self):
@@ -714,55 +1550,32 @@ class Inode:
 
     @property
     def mode_str(self):
-        special_flag = lambda letter, execute, special: {
-            (False, False): "-",
-            (False, True): letter.upper(),
-            (True, False): "x",
-            (True, True): letter.lower()
-        }[(execute, special)]
+        if self._mode_str is None:
+            mode = self.mode
+            special_flag = lambda letter, execute, special: {
+                (False, False): "-",
+                (False, True): letter.upper(),
+                (True, False): "x",
+                (True, True): letter.lower()
+            }[(execute, special)]
 
-        try:
-            if (self.volume.superblock.s_feature_incompat & ext4_superblock.INCOMPAT_FILETYPE) == 0:
-                device_type = {
-                    ext4_inode.S_IFIFO: "p",
-                    ext4_inode.S_IFCHR: "c",
-                    ext4_inode.S_IFDIR: "d",
-                    ext4_inode.S_IFBLK: "b",
-                    ext4_inode.S_IFREG: "-",
-                    ext4_inode.S_IFLNK: "l",
-                    ext4_inode.S_IFSOCK: "s",
-                }[self.inode.i_mode & 0xF000]
-            else:
-                device_type = {
-                    InodeType.FILE: "-",
-                    InodeType.DIRECTORY: "d",
-                    InodeType.CHARACTER_DEVICE: "c",
-                    InodeType.BLOCK_DEVICE: "b",
-                    InodeType.FIFO: "p",
-                    InodeType.SOCKET: "s",
-                    InodeType.SYMBOLIC_LINK: "l"
-                }[self.file_type]
-        except KeyError:
-            device_type = "?"
+            self._mode_str = "".join([
+                Inode.TYPE_LETTERS.get(self.file_type, "?"),
 
-        return "".join([
-            device_type,
+                "r" if (mode & ext4_inode.S_IRUSR) != 0 else "-",
+                "w" if (mode & ext4_inode.S_IWUSR) != 0 else "-",
+                special_flag("s", (mode & ext4_inode.S_IXUSR) != 0, (mode & ext4_inode.S_ISUID) != 0),
 
-            "r" if (self.inode.i_mode & ext4_inode.S_IRUSR) != 0 else "-",
-            "w" if (self.inode.i_mode & ext4_inode.S_IWUSR) != 0 else "-",
-            special_flag("s", (self.inode.i_mode & ext4_inode.S_IXUSR) != 0,
-                         (self.inode.i_mode & ext4_inode.S_ISUID) != 0),
+                "r" if (mode & ext4_inode.S_IRGRP) != 0 else "-",
+                "w" if (mode & ext4_inode.S_IWGRP) != 0 else "-",
+                special_flag("s", (mode & ext4_inode.S_IXGRP) != 0, (mode & ext4_inode.S_ISGID) != 0),
 
-            "r" if (self.inode.i_mode & ext4_inode.S_IRGRP) != 0 else "-",
-            "w" if (self.inode.i_mode & ext4_inode.S_IWGRP) != 0 else "-",
-            special_flag("s", (self.inode.i_mode & ext4_inode.S_IXGRP) != 0,
-                         (self.inode.i_mode & ext4_inode.S_ISGID) != 0),
+                "r" if (mode & ext4_inode.S_IROTH) != 0 else "-",
+                "w" if (mode & ext4_inode.S_IWOTH) != 0 else "-",
+                special_flag("t", (mode & ext4_inode.S_IXOTH) != 0, (mode & ext4_inode.S_ISVTX) != 0),
+            ])
 
-            "r" if (self.inode.i_mode & ext4_inode.S_IROTH) != 0 else "-",
-            "w" if (self.inode.i_mode & ext4_inode.S_IWOTH) != 0 else "-",
-            special_flag("t", (self.inode.i_mode & ext4_inode.S_IXOTH) != 0,
-                         (self.inode.i_mode & ext4_inode.S_ISVTX) != 0),
-        ])
+        return self._mode_str
 
     def open_dir(self, decode_name=None):
         # Parse args
@@ -772,74 +1585,164 @@ class Inode:
         if not self.volume.ignore_flags and not self.is_dir:
             raise Ext4Error(f"Inode ({self.inode_idx:d}) is not a directory.")
 
-        # # Hash trees are compatible with linear arrays
-        if (self.inode.i_flags & ext4_inode.EXT4_INDEX_FL) != 0:
-            ...
+        if (self.flags & ext4_inode.EXT4_INLINE_DATA_FL) != 0:
+            yield from self._open_inline_dir(decode_name)
+            return
 
-        # Read raw directory content
+        # Hash trees are compatible with linear arrays: the dx_root/dx_node blocks read as "." and ".." plus
+        # unused entries, so a full listing simply reads every block (see _dx_leaf_blocks for lookups)
         raw_data = self.open_read().read()
-        offset = 0
 
-        while offset < len(raw_data):
-            dirent = ext4_dir_entry_2._from_buffer_copy(raw_data, offset, platform64=self.volume.platform64)
+        for name, inode_idx, file_type in self.volume.parser.dir_entries(raw_data, self.volume.platform64):
+            if inode_idx == 0 and (self.flags & ext4_inode.EXT4_INDEX_FL) != 0:
+                # Unused entry covering a dx_node block
+                continue
+            if file_type != InodeType.CHECKSUM:
+                yield decode_name(name), inode_idx, file_type
+
+    def _open_inline_dir(self, decode_name):
+        # Inline directory: parent inode (4 bytes) instead of "." and "..", then entries up to the end of i_block
+        # and, as a second list, in the "system.data" xattr
+        raw_data = self.open_read().read()
+        if len(raw_data) < 4:
+            return
 
-            if dirent.file_type != InodeType.CHECKSUM:
-                yield decode_name(dirent.name), dirent.inode, dirent.file_type
+        yield decode_name(b"."), self.inode_idx, InodeType.DIRECTORY
+        yield decode_name(b".."), int.from_bytes(raw_data[:4], "little"), InodeType.DIRECTORY
 
-            offset += dirent.rec_len
+        i_block_size = ext4_inode.i_block.size
+        for region in (raw_data[4: i_block_size], raw_data[i_block_size:]):
+            for name, inode_idx, file_type in self.volume.parser.dir_entries(region, self.volume.platform64):
+                if inode_idx != 0 and file_type != InodeType.CHECKSUM:
+                    yield decode_name(name), inode_idx, file_type
 
     def open_read(self):
-        if (self.inode.i_flags & ext4_inode.EXT4_EXTENTS_FL) != 0:
+        # The block mapping strategy is picked per inode: extent tree, inline data, fast symlink or block map
+        if (self.flags & ext4_inode.EXT4_EXTENTS_FL) != 0:
             # Obtain mapping from extents
             mapping = []  # List of MappingEntry instances
 
+            # Queue of raw extent tree nodes; the root node lives in i_block
             nodes = queue.Queue()
-            nodes.put_nowait(self.offset + ext4_inode.i_block.offset)
+            nodes.put_nowait(self.raw[ext4_inode.i_block.offset: ext4_inode.i_block.offset + ext4_inode.i_block.size])
 
+            parser = self.volume.parser
             while nodes.qsize() != 0:
-                header_offset = nodes.get_nowait()
-                header = self.volume.read_struct(ext4_extent_header, header_offset)
+                node = nodes.get_nowait()
+                eh_magic, eh_entries, eh_depth = parser.extent_header(node)
 
-                if not self.volume.ignore_magic and header.eh_magic != 0xF30A:
+                if not self.volume.ignore_magic and eh_magic != 0xF30A:
                     raise MagicError(
                         f"Invalid magic value in extent header at offset 0x{self.inode_idx:X} of"
-                        f" inode {self.inode_idx:d}: 0x{header.eh_magic:04X} (expected 0xF30A)")
+                        f" inode {self.inode_idx:d}: 0x{eh_magic:04X} (expected 0xF30A)")
 
-                if header.eh_depth != 0:
-                    indices = self.volume.read_struct(ext4_extent_idx * header.eh_entries,
-                                                      header_offset + ctypes.sizeof(ext4_extent_header))
-                    for idx in indices:
-                        nodes.put_nowait(idx.ei_leaf * self.volume.block_size)
+                if eh_depth != 0:
+                    for ei_leaf in parser.extent_indices(node, eh_entries):
+                        nodes.put_nowait(self.volume.read(ei_leaf * self.volume.block_size, self.volume.block_size))
                 else:
-                    extents = self.volume.read_struct(ext4_extent * header.eh_entries,
-                                                      header_offset + ctypes.sizeof(ext4_extent_header))
-                    for extent in extents:
-                        mapping.append(MappingEntry(extent.ee_block, extent.ee_start, extent.ee_len))
+                    for ee_block, ee_len, ee_start in parser.extent_leaves(node, eh_entries):
+                        if ee_len > ext4_extent.EXT_INIT_MAX_LEN:
+                            # Uninitialized extent: reads as zeros, so it is left out of the mapping (hole)
+                            continue
+                        mapping.append(MappingEntry(ee_block, ee_start, ee_len))
 
             MappingEntry.optimize(mapping)
             return BlockReader(self.volume, len(self), mapping)
+        elif (self.flags & ext4_inode.EXT4_INLINE_DATA_FL) != 0:
+            # Inline data: the first 60 bytes live in i_block, the rest in the "system.data" xattr
+            i_block = self.raw[ext4_inode.i_block.offset: ext4_inode.i_block.offset + ext4_inode.i_block.size]
+            data = bytes(i_block[:self.size])
+            if self.size > len(data):
+                data += next((xattr_value for xattr_name, xattr_value in self.xattrs(check_block=False) if xattr_name == "system.data"), b"")
+            return io.BytesIO(data[:self.size])
+        elif self.is_symlink and self._is_fast_symlink:
+            # Link target stored in i_block itself
+            i_block = self.raw[ext4_inode.i_block.offset: ext4_inode.i_block.offset + ext4_inode.i_block.size]
+            return io.BytesIO(bytes(i_block[:self.size]))
         else:
-            # Inode uses inline data
-            i_block = self.volume.read(self.offset + ext4_inode.i_block.offset, ext4_inode.i_block.size)
-            return io.BytesIO(i_block[:self.inode.i_size])
+            # Block map (ext2/ext3, ext4 without extents): 12 direct blocks, then single, double and triple indirect blocks
+            return BlockReader(self.volume, len(self), self._indirect_mapping())
+
+    @property
+    def _is_fast_symlink(self):
+        # No data blocks (besides an xattr block): the target lives in i_block
+        xattr_sectors = self.volume.block_size // 512 if self.inode.i_file_acl != 0 else 0
+        return self.size < ext4_inode.i_block.size and self.inode.i_blocks_lo - xattr_sectors == 0
+
+    def _indirect_mapping(self):
+        block_size = self.volume.block_size
+        block_count = (self.size + block_size - 1) // block_size
+        pointers = struct.Struct(f"<{block_size // 4:d}I")
+
+        mapping = []  # List of MappingEntry instances, contiguous blocks merged on the fly
+
+        def add_run(file_block_idx, disk_block_idx):
+            if disk_block_idx == 0:
+                # Hole
+                return
+            if mapping:
+                last = mapping[-1]
+                if last.file_block_idx + last.block_count == file_block_idx and last.disk_block_idx + last.block_count == disk_block_idx:
+                    last.block_count += 1
+                    return
+            mapping.append(MappingEntry(file_block_idx, disk_block_idx))
+
+        def map_indirect(indirect_block_idx, level, first_file_block_idx):
+            # Every indirect block is read once; level 1 points to data blocks, higher levels to indirect blocks
+            span = (block_size // 4) ** (level - 1)
+            raw = self.volume.read(indirect_block_idx * block_size, block_size)
+            if len(raw) < block_size:
+                raise EndOfStreamError(f"Indirect block {indirect_block_idx:d} of inode {self.inode_idx:d} lies beyond the end of the image.")
+
+            for i, pointer in enumerate(pointers.unpack_from(raw)):
+                file_block_idx = first_file_block_idx + i * span
+                if file_block_idx >= block_count:
+                    break
+                if level == 1:
+                    add_run(file_block_idx, pointer)
+                elif pointer != 0:
+                    map_indirect(pointer, level - 1, file_block_idx)
+
+        i_block = self.inode.i_block
+        for file_block_idx in range(min(12, block_count)):
+            add_run(file_block_idx, i_block[file_block_idx])
+
+        first_file_block_idx = 12
+        for level in (1, 2, 3):
+            if first_file_block_idx >= block_count:
+                break
+            if i_block[11 + level] != 0:
+                map_indirect(i_block[11 + level], level, first_file_block_idx)
+            first_file_block_idx += (block_size // 4) ** level
+
+        return mapping
 
     @property
     def size_readable(self):
-        if self.inode.i_size < 1024:
-            return f"{self.inode.i_size:d} bytes" if self.inode.i_size != 1 else "1 byte"
+        if self.size < 1024:
+            return f"{self.size:d} bytes" if self.size != 1 else "1 byte"
         else:
             units = ["KiB", "MiB", "GiB", "TiB", "PiB", "EiB", "ZiB", "YiB"]
-            unit_idx = min(int(log_math(self.inode.i_size, 1024)), len(units))
+            unit_idx = min(int(log_math(self.size, 1024)), len(units))
 
-            return f"{self.inode.i_size / (1024 ** unit_idx):.2f} {units[unit_idx - 1]:s}"
+            return f"{self.size / (1024 ** unit_idx):.2f} {units[unit_idx - 1]:s}"
+
+    def read_link(self):
+        raw = self.open_read().read()
+        try:
+            return raw.decode("utf8")
+        except UnicodeDecodeError:
+            # Not a fast symlink: the link data starts with the block holding the target
+            link_target_block = int.from_bytes(raw, "little")
+            return bytes(self.volume.read(link_target_block * self.volume.block_size, self.size)).decode("utf8", errors="ignore")
 
     def xattrs(self, check_inline=True, check_block=True, force_inline=False):
         # Inline xattrs
-        inline_data_offset = self.offset + ext4_inode.EXT2_GOOD_OLD_INODE_SIZE + self.inode.i_extra_isize
-        inline_data_length = self.offset + self.volume.superblock.s_inode_size - inline_data_offset
+        inline_data_offset = ext4_inode.EXT2_GOOD_OLD_INODE_SIZE + self.inode.i_extra_isize
+        inline_data_length = self.volume.inode_size - inline_data_offset
 
         if check_inline and inline_data_length > ctypes.sizeof(ext4_xattr_ibody_header):
-            inline_data = self.volume.read(inline_data_offset, inline_data_length)
+            inline_data = self.raw[inline_data_offset: inline_data_offset + inline_data_length]
             xattrs_header = ext4_xattr_ibody_header.from_buffer_copy(inline_data)
 
             # TODO Find way to detect inline xattrs without checking the h_magic field to enable error detection with
@@ -881,6 +1784,9 @@ class BlockReader:
     # OSError
     EINVAL = 22
 
+    # Preallocated zeros used to fill holes
+    ZERO_CHUNK = bytes(1 << 20)
+
     def __init__(self, volume, byte_size, block_map):
         self.byte_size = byte_size
         self.volume = volume
@@ -893,20 +1799,48 @@ class BlockReader:
         MappingEntry.optimize(block_map)
         self.block_map = block_map
 
+        # Sorted parallel arrays for binary search over the mapping
+        self._file_starts = [entry.file_block_idx for entry in block_map]
+        self._disk_starts = [entry.disk_block_idx for entry in block_map]
+        self._block_counts = [entry.block_count for entry in block_map]
+
     def __repr__(self):
         return f"{type(self).__name__:s}(byte_size = {self.byte_size!r:s}, block_map = {self.block_map!r:s}, volume_uuid = {self.volume.uuid!r:s})"
 
     def get_block_mapping(self, file_block_idx):
-        disk_block_idx = None
+        i = bisect_right(self._file_starts, file_block_idx) - 1
 
-        # Find disk block
-        for entry in self.block_map:
-            if entry.file_block_idx <= file_block_idx < entry.file_block_idx + entry.block_count:
-                block_diff = file_block_idx - entry.file_block_idx
-                disk_block_idx = entry.disk_block_idx + block_diff
-                break
+        if i >= 0 and file_block_idx < self._file_starts[i] + self._block_counts[i]:
+            return self._disk_starts[i] + (file_block_idx - self._file_starts[i])
+        else:
+            return None
+
+    def iter_block_runs(self, start_block_idx, end_block_idx):
+        # Yields (file_block_idx, disk_block_idx, block_count) runs covering [start_block_idx, end_block_idx),
+        # walking the mapping in order; disk_block_idx is None for holes
+        file_block_idx = start_block_idx
+        i = max(0, bisect_right(self._file_starts, file_block_idx) - 1)
+
+        while file_block_idx < end_block_idx:
+            if i < len(self._file_starts) and self._file_starts[i] + self._block_counts[i] <= file_block_idx:
+                i += 1
+                continue
+
+            if i >= len(self._file_starts):
+                yield file_block_idx, None, end_block_idx - file_block_idx
+                return
+
+            entry_start = self._file_starts[i]
+            if file_block_idx < entry_start:
+                # Hole up to the next mapped run
+                block_count = min(entry_start, end_block_idx) - file_block_idx
+                yield file_block_idx, None, block_count
+            else:
+                block_count = min(entry_start + self._block_counts[i], end_block_idx) - file_block_idx
+                yield file_block_idx, self._disk_starts[i] + (file_block_idx - entry_start), block_count
+                i += 1
 
-        return disk_block_idx
+            file_block_idx += block_count
 
     def read(self, byte_len=-1):
         # Parse args
@@ -919,27 +1853,163 @@ class BlockReader:
         if byte_len == 0:
             return b""
 
-        # Reading blocks
-        start_block_idx = self.cursor // self.volume.block_size
-        end_block_idx = (self.cursor + byte_len - 1) // self.volume.block_size
-        end_of_stream_check = byte_len
+        result = bytearray(byte_len)
+        self.readinto(result)
+        return bytes(result)
 
-        blocks = [self.read_block(i) for i in range(start_block_idx, end_block_idx - start_block_idx + 1)]
+    def readinto(self, buffer):
+        buffer = memoryview(buffer).cast("B")
+        byte_len = max(0, min(len(buffer), self.byte_size - self.cursor))
 
-        start_offset = self.cursor % self.volume.block_size
-        if start_offset != 0:
-            blocks[0] = blocks[0][start_offset:]
-        byte_len = (byte_len + start_offset - self.volume.block_size - 1) % self.volume.block_size + 1
-        blocks[-1] = blocks[-1][:byte_len]
+        if byte_len == 0:
+            return 0
 
-        result = b"".join(blocks)
+        # One read per contiguous disk run, written straight into buffer
+        block_size = self.volume.block_size
+        start_block_idx = self.cursor // block_size
+        end_block_idx = (self.cursor + byte_len - 1) // block_size
+        position = start_block_idx * block_size - self.cursor  # Position of the current run in buffer
 
-        # Check read
-        if len(result) != end_of_stream_check:
-            raise EndOfStreamError(f"The volume's underlying stream ended {byte_len - len(result):d} bytes before EOF.")
+        for file_block_idx, disk_block_idx, block_count in self.iter_block_runs(start_block_idx, end_block_idx + 1):
+            lo = max(0, position)
+            hi = min(byte_len, position + block_count * block_size)
 
-        self.cursor += len(result)
-        return result
+            if disk_block_idx is None:
+                self._fill_zero(buffer[lo:hi])
+            else:
+                received = self.volume.readinto(disk_block_idx * block_size + (lo - position), buffer[lo:hi])
+                if received != hi - lo:
+                    raise EndOfStreamError(f"The volume's underlying stream ended {hi - lo - received:d} bytes before EOF.")
+
+            position += block_count * block_size
+
+        self.cursor += byte_len
+        return byte_len
+
+    def run_length(self):
+        # Bytes from the cursor to the end of the current run (mapped extent or hole)
+        block_size = self.volume.block_size
+        file_block_idx = self.cursor // block_size
+        i = bisect_right(self._file_starts, file_block_idx) - 1
+
+        if i >= 0 and file_block_idx < self._file_starts[i] + self._block_counts[i]:
+            run_end = (self._file_starts[i] + self._block_counts[i]) * block_size
+        elif i + 1 < len(self._file_starts):
+            run_end = self._file_starts[i + 1] * block_size
+        else:
+            run_end = self.byte_size
+
+        return max(0, min(run_end, self.byte_size) - self.cursor)
+
+    def copy_to(self, out, chunk_size=1 << 20, kernel_copy=True, sparse=False):
+        # sparse: holes are skipped with seek instead of written, and the file is extended with truncate at the end
+        block_size = self.volume.block_size
+        copied = 0
+
+        if kernel_copy and self.volume.raw_fd is not None:
+            try:
+                out_fd = out.fileno()
+            except (AttributeError, io.UnsupportedOperation, OSError):
+                out_fd = None
+
+            if out_fd is not None:
+                copied += self._kernel_copy_to(out, out_fd, sparse)
+
+        # User-space copy for whatever the kernel did not take
+        buffer = None
+        while self.cursor < self.byte_size:
+            run_len = self.run_length()
+
+            if sparse and self.get_block_mapping(self.cursor // block_size) is None:
+                out.seek(run_len, io.SEEK_CUR)
+                self.cursor += run_len
+                copied += run_len
+                continue
+
+            if buffer is None:
+                buffer = memoryview(bytearray(chunk_size))
+            n = self.readinto(buffer[:min(chunk_size, run_len)])
+            if n == 0:
+                break
+            out.write(buffer[:n])
+            copied += n
+
+        if sparse:
+            out.truncate()
+
+        return copied
+
+    def _kernel_copy_to(self, out, out_fd, sparse=False):
+        # Copies mapped runs with os.copy_file_range (falling back to os.sendfile), so the data never passes
+        # through Python. Stops at the first run the kernel refuses to copy.
+        block_size = self.volume.block_size
+        copied = 0
+
+        out.flush()
+        try:
+            while self.cursor < self.byte_size:
+                run_len = self.run_length()
+                disk_block_idx = self.get_block_mapping(self.cursor // block_size)
+
+                if disk_block_idx is None and sparse:
+                    os.lseek(out_fd, run_len, io.SEEK_CUR)
+                    n = run_len
+                elif disk_block_idx is None:
+                    n = self._write_zero(out_fd, run_len)
+                else:
+                    src_offset = self.volume.offset + disk_block_idx * block_size + self.cursor % block_size
+                    n = self._kernel_copy(self.volume.raw_fd, out_fd, src_offset, run_len)
+
+                self.cursor += n
+                copied += n
+                if n < run_len:
+                    break
+        finally:
+            # Resync the Python file object with the descriptor's position
+            out.seek(os.lseek(out_fd, 0, io.SEEK_CUR))
+
+        return copied
+
+    @staticmethod
+    def _kernel_copy(src_fd, out_fd, src_offset, byte_len):
+        use_copy_file_range = hasattr(os, "copy_file_range")
+        done = 0
+
+        while done < byte_len:
+            try:
+                if use_copy_file_range:
+                    n = os.copy_file_range(src_fd, out_fd, byte_len - done, src_offset + done)
+                elif hasattr(os, "sendfile"):
+                    n = os.sendfile(out_fd, src_fd, src_offset + done, byte_len - done)
+                else:
+                    break
+            except OSError:
+                # EXDEV, ENOSYS, EINVAL, ... : try the next method, then give up
+                if use_copy_file_range:
+                    use_copy_file_range = False
+                    continue
+                break
+
+            if n == 0:
+                break
+            done += n
+
+        return done
+
+    @staticmethod
+    def _write_zero(out_fd, byte_len):
+        zero = memoryview(BlockReader.ZERO_CHUNK)
+        done = 0
+        while done < byte_len:
+            done += os.write(out_fd, zero[:min(len(zero), byte_len - done)])
+        return done
+
+    @staticmethod
+    def _fill_zero(buffer):
+        zero_len = len(BlockReader.ZERO_CHUNK)
+        for i in range(0, len(buffer), zero_len):
+            chunk = buffer[i:i + zero_len]
+            chunk[:] = BlockReader.ZERO_CHUNK[:len(chunk)]
 
     def read_block(self, file_block_idx):
         disk_block_idx = self.get_block_mapping(file_block_idx)
@@ -947,7 +2017,7 @@ class BlockReader:
         if disk_block_idx is not None:
             return self.volume.read(disk_block_idx * self.volume.block_size, self.volume.block_size)
         else:
-            return bytes([0] * self.volume.block_size)
+            return bytes(self.volume.block_size)
 
     def seek(self, seek, seek_mode=io.SEEK_SET):
         if seek_mode == io.SEEK_CUR:
@@ -965,3 +2035,75 @@ class BlockReader:
 
     def tell(self):
         return self.cursor
+
+
+class WalkEntry:
+    def __init__(self, path, name, inode, xattrs, link_target):
+        self.path = path
+        self.name = name
+        self.inode = inode
+
+        self.inode_idx = inode.inode_idx
+        self.file_type = inode.file_type
+        self.mode = inode.mode
+        self.uid = inode.uid
+        self.gid = inode.gid
+
+        self.xattrs = xattrs  # List of (name, value) tuples
+        self.link_target = link_target  # None unless symlink
+
+        # Set to False before resuming walk() to skip the contents of this directory
+        self.descend = True
+
+    def __repr__(self):
+        return f"{type(self).__name__:s}(path = {self.path!r:s}, inode_idx = {self.inode_idx!r:s}, file_type = {self.file_type!r:s})"
+
+    @classmethod
+    def from_dirent(cls, volume, dir_path, entry_name, entry_inode_idx, entry_type, read_xattrs=True):
+        inode = volume.get_inode(entry_inode_idx, entry_type)
+        xattrs = list(inode.xattrs()) if read_xattrs else []
+        link_target = inode.read_link() if inode.is_symlink else None
+
+        return cls(dir_path + "/" + entry_name, entry_name, inode, xattrs, link_target)
+
+    @property
+    def is_dir(self):
+        return self.inode.is_dir
+
+    @property
+    def is_file(self):
+        return self.inode.is_file
+
+    @property
+    def is_symlink(self):
+        return self.inode.is_symlink
+
+    @property
+    def mode_str(self):
+        return self.inode.mode_str
+
+
+def walk(volume, root_inode=None, root_path="", read_xattrs=True):
+    # Depth-first pre-order walk (same order as a recursive scan) using an explicit stack of open_dir iterators,
+    # so the depth of the tree is not limited by the recursion limit
+    if root_inode is None:
+        root_inode = volume.root
+
+    stack = [(root_path, root_inode.open_dir())]
+    while stack:
+        dir_path, dir_entries = stack[-1]
+
+        dirent = next(dir_entries, None)
+        if dirent is None:
+            stack.pop()
+            continue
+
+        entry_name, entry_inode_idx, entry_type = dirent
+        if entry_name in (".", ".."):
+            continue
+
+        entry = WalkEntry.from_dirent(volume, dir_path, entry_name, entry_inode_idx, entry_type, read_xattrs)
+        yield entry
+
+        if entry.descend and entry.is_dir:
+            stack.append((entry.path, entry.inode.open_dir()))
@@ -0,0 +1,234 @@
+# Derived from https://github.com/cubinator/ext4
+# Original author: cubinator
+# License: GNU General Public License v3.0
+# Modifications: asyncio facade over ext4.Volume
+
+# pylint: disable=line-too-long
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+import functools
+
+from ext4 import EndOfStreamError, InodeType, Volume
+
+
+class ReadBatcher:
+    # Reads requested during the same event loop iteration are sorted and merged into as few
+    # Volume.read calls as possible (ranges closer than max_gap bytes are read together).
+
+    def __init__(self, volume, executor, max_gap=64 * 1024, max_read=8 * 1024 * 1024):
+        self.volume = volume
+        self.executor = executor
+        self.max_gap = max_gap
+        self.max_read = max_read
+
+        self.requests = 0
+        self.reads = 0
+
+        self._pending = []
+        self._scheduled = False
+
+    def __repr__(self):
+        return f"{type(self).__name__:s}(requests = {self.requests!r:s}, reads = {self.reads!r:s})"
+
+    def read(self, offset, byte_len):
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+
+        self._pending.append((offset, byte_len, future))
+        self.requests += 1
+
+        if not self._scheduled:
+            self._scheduled = True
+            loop.call_soon(self._flush, loop)
+
+        return future
+
+    def _flush(self, loop):
+        pending, self._pending = self._pending, []
+        self._scheduled = False
+
+        pending.sort(key=lambda request: request[0])
+
+        group = []
+        group_start = group_end = 0
+        for request in pending:
+            offset, byte_len, _ = request
+            if group and offset <= group_end + self.max_gap and max(group_end, offset + byte_len) - group_start <= self.max_read:
+                group.append(request)
+                group_end = max(group_end, offset + byte_len)
+            else:
+                if group:
+                    self._submit(loop, group_start, group_end, group)
+                group = [request]
+                group_start, group_end = offset, offset + byte_len
+
+        if group:
+            self._submit(loop, group_start, group_end, group)
+
+    def _submit(self, loop, start, end, group):
+        self.reads += 1
+        task = loop.run_in_executor(self.executor, self.volume.read, start, end - start)
+        task.add_done_callback(functools.partial(ReadBatcher._deliver, start, group))
+
+    @staticmethod
+    def _deliver(start, group, task):
+        if task.cancelled():
+            for _, _, future in group:
+                future.cancel()
+            return
+
+        error = task.exception()
+        data = None if error is not None else task.result()
+
+        for offset, byte_len, future in group:
+            if future.done():
+                continue
+            if error is not None:
+                future.set_exception(error)
+            else:
+                future.set_result(bytes(data[offset - start: offset - start + byte_len]))
+
+
+class AsyncVolume:
+    def __init__(self, volume, executor=None, max_workers=4, max_gap=64 * 1024):
+        self.volume = volume
+
+        self._own_executor = executor is None
+        self.executor = executor if executor is not None else ThreadPoolExecutor(max_workers=max_workers)
+        self.batcher = ReadBatcher(volume, self.executor, max_gap=max_gap)
+
+        self._stream = None  # Set when the image was opened by AsyncVolume.open
+
+    def __repr__(self):
+        return f"{type(self).__name__:s}({self.volume!r:s})"
+
+    @classmethod
+    async def open(cls, path, executor=None, max_workers=4, volume_class=Volume, **volume_options):
+        loop = asyncio.get_running_loop()
+        own_executor = executor is None
+        executor = executor if executor is not None else ThreadPoolExecutor(max_workers=max_workers)
+
+        stream = await loop.run_in_executor(executor, open, path, "rb")
+        try:
+            volume = await loop.run_in_executor(executor, functools.partial(volume_class, stream, **volume_options))
+        except BaseException:
+            stream.close()
+            if own_executor:
+                executor.shutdown(wait=False)
+            raise
+
+        avolume = cls(volume, executor)
+        avolume._own_executor = own_executor
+        avolume._stream = stream
+        return avolume
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.aclose()
+
+    async def aclose(self):
+        if hasattr(self.volume, "close"):
+            self.volume.close()
+        if self._stream is not None:
+            self._stream.close()
+            self._stream = None
+        if self._own_executor:
+            self.executor.shutdown(wait=False)
+
+    async def _run(self, func, *args):
+        return await asyncio.get_running_loop().run_in_executor(self.executor, functools.partial(func, *args))
+
+    async def aread(self, offset, byte_len):
+        return await self.batcher.read(offset, byte_len)
+
+    async def aget_inode(self, inode_idx, file_type=InodeType.UNKNOWN):
+        return AsyncInode(self, await self._run(self.volume.get_inode, inode_idx, file_type))
+
+    async def aroot(self):
+        return await self.aget_inode(Volume.ROOT_INODE, InodeType.DIRECTORY)
+
+
+class AsyncInode:
+    def __init__(self, avolume, inode):
+        self.avolume = avolume
+        self._inode = inode
+
+    def __repr__(self):
+        return f"{type(self).__name__:s}({self._inode!r:s})"
+
+    def __getattr__(self, name):
+        # Decoded attributes (inode, is_dir, mode_str, inode_idx, ...) do not touch the disk
+        return getattr(self._inode, name)
+
+    async def aget_inode(self, *relative_path, decode_name=None):
+        inode = await self.avolume._run(functools.partial(self._inode.get_inode, *relative_path, decode_name=decode_name))
+        return AsyncInode(self.avolume, inode)
+
+    async def aopen_dir(self, decode_name=None):
+        entries = await self.avolume._run(lambda: list(self._inode.open_dir(decode_name)))
+        for entry in entries:
+            yield entry
+
+    async def aopen_read(self):
+        return AsyncBlockReader(self.avolume, await self.avolume._run(self._inode.open_read))
+
+    async def axattrs(self, check_inline=True, check_block=True, force_inline=False):
+        return await self.avolume._run(lambda: list(self._inode.xattrs(check_inline, check_block, force_inline)))
+
+
+class AsyncBlockReader:
+    def __init__(self, avolume, reader):
+        self.avolume = avolume
+        self._reader = reader
+
+    def __repr__(self):
+        return f"{type(self).__name__:s}({self._reader!r:s})"
+
+    def seek(self, seek, seek_mode=0):
+        return self._reader.seek(seek, seek_mode)
+
+    def tell(self):
+        return self._reader.tell()
+
+    async def aread(self, byte_len=-1):
+        reader = self._reader
+
+        if not hasattr(reader, "iter_block_runs"):
+            # Inline data (BytesIO), already in memory
+            return reader.read(byte_len)
+
+        if byte_len < -1:
+            raise ValueError("byte_len must be non-negative or -1")
+
+        bytes_remaining = reader.byte_size - reader.cursor
+        byte_len = bytes_remaining if byte_len == -1 else max(0, min(byte_len, bytes_remaining))
+        if byte_len == 0:
+            return b""
+
+        block_size = self.avolume.volume.block_size
+        start_block_idx = reader.cursor // block_size
+        end_block_idx = (reader.cursor + byte_len - 1) // block_size
+        position = start_block_idx * block_size - reader.cursor
+
+        # Reserve the range before awaiting, so concurrent aread calls on the same reader do not overlap
+        reader.cursor += byte_len
+
+        # Every mapped run becomes one batched read; holes stay zero
+        pieces = []
+        for file_block_idx, disk_block_idx, block_count in reader.iter_block_runs(start_block_idx, end_block_idx + 1):
+            lo = max(0, position)
+            hi = min(byte_len, position + block_count * block_size)
+            if disk_block_idx is not None:
+                pieces.append((lo, hi, self.avolume.batcher.read(disk_block_idx * block_size + (lo - position), hi - lo)))
+            position += block_count * block_size
+
+        result = bytearray(byte_len)
+        for lo, hi, future in pieces:
+            data = await future
+            if len(data) != hi - lo:
+                raise EndOfStreamError(f"The volume's underlying stream ended {hi - lo - len(data):d} bytes before EOF.")
+            result[lo:hi] = data
+
+        return bytes(result)
@@ -18,15 +18,100 @@ def print_help():
     print("EXT4 Tool CLI")
     print("Usage:")
     print("  --read   <path/to/image.img>")
-    print("  --unpack <path/to/image.img>")
+    print("  --batch  <image|folder|glob>... [--workers <N>] [--partition <name>]... [unpack options]")
+    print("  --unpack <path/to/image.img> [--no-mmap] [--cache-size <MiB>] [--prefetch-inode-tables] [--buffer-size <KiB>] [--no-kernel-copy] [--no-sparse] [--jobs <N>] [--processes <N>] [--partition <name>]... [--partition-workers <N>] [--include <pattern>]... [--exclude <pattern>]...")
     sys.exit(1)
 
+def option_value(args, i):
+    if i + 1 >= len(args):
+        print(f"[ERR] Missing value for {args[i]}")
+        print_help()
+    return args[i + 1]
+
+def option_int(args, i, minimum):
+    value = option_value(args, i)
+    try:
+        return max(minimum, int(value))
+    except ValueError:
+        print(f"[ERR] {args[i]} expects a number, got: {value}")
+        print_help()
+
+def parse_options(args):
+    opts = {"use_mmap": True, "cache_size": 0, "prefetch_inode_tables": False, "buffer_size": 1 << 20, "kernel_copy": True, "sparse": True, "jobs": 1, "processes": 0, "partitions": [], "partition_workers": 1, "workers": 2, "include": [], "exclude": []}
+    i = 0
+    while i < len(args):
+        arg = args[i]
+        if arg == "--no-mmap":
+            opts["use_mmap"] = False
+        elif arg == "--prefetch-inode-tables":
+            opts["prefetch_inode_tables"] = True
+        elif arg == "--no-kernel-copy":
+            opts["kernel_copy"] = False
+        elif arg == "--no-sparse":
+            opts["sparse"] = False
+        elif arg == "--cache-size":
+            opts["cache_size"] = option_int(args, i, 0) * 1024 * 1024
+            i += 1
+        elif arg == "--jobs":
+            opts["jobs"] = option_int(args, i, 1)
+            i += 1
+        elif arg == "--processes":
+            opts["processes"] = option_int(args, i, 0)
+            i += 1
+        elif arg == "--partition":
+            opts["partitions"].append(option_value(args, i))
+            i += 1
+        elif arg == "--partition-workers":
+            opts["partition_workers"] = option_int(args, i, 1)
+            i += 1
+        elif arg == "--include":
+            opts["include"].append(option_value(args, i))
+            i += 1
+        elif arg == "--exclude":
+            opts["exclude"].append(option_value(args, i))
+            i += 1
+        elif arg == "--workers":
+            opts["workers"] = option_int(args, i, 1)
+            i += 1
+        elif arg == "--buffer-size":
+            opts["buffer_size"] = option_int(args, i, 4) * 1024
+            i += 1
+        else:
+            print(f"[ERR] Unknown option: {arg}")
+            print_help()
+        i += 1
+    return opts
+
 def main():
     if len(sys.argv) < 3:
         print_help()
 
     cmd = sys.argv[1]
+
+    # ---- BATCH MODE ----
+    # list image / folder / glob, di-unpack barengan dalam satu proses, ditutup tabel ringkasan
+    if cmd == "--batch":
+        sources = []
+        i = 2
+        while i < len(sys.argv) and not sys.argv[i].startswith("--"):
+            sources.append(sys.argv[i])
+            i += 1
+        opts = parse_options(sys.argv[i:])
+        opts.pop("partition_workers")
+
+        from unpack import collect_images, unpack_batch
+        images = collect_images(sources)
+        if not images:
+            print("[ERR] No images found")
+            sys.exit(2)
+
+        results = unpack_batch(images, opts.pop("workers"), opts.pop("partitions"), **opts)
+        if not all(result["ok"] for result in results):
+            sys.exit(1)
+        return
+
     img = sys.argv[2]
+    opts = parse_options(sys.argv[3:])
 
     if not os.path.exists(img):
         print(f"[ERR] File not found: {img}")
@@ -40,8 +125,28 @@ def main():
 
     # ---- UNPACK MODE ----
     if cmd == "--unpack":
-        from unpack import main as unpack_main
-        ok, out_dir = unpack_main(img)
+        from unpack import main as unpack_main, main_super, is_super_image
+        partitions = opts.pop("partitions")
+        partition_workers = opts.pop("partition_workers")
+        opts.pop("workers")
+
+        # super.img (dynamic partitions): partisi logical di-unpack langsung, tanpa lpunpack
+        is_super = is_super_image(img)
+        if partitions and not is_super:
+            print(f"[ERR] --partition needs a super image (dynamic partitions), {img} is not one")
+            sys.exit(2)
+
+        if is_super:
+            results = main_super(img, partitions, partition_workers, **opts)
+            for name, (ok, out_dir) in results:
+                print(f"[{'OK' if ok else 'ERR'}] {name}: {out_dir}")
+            if all(ok for _, (ok, _) in results):
+                print("[OK] Unpack finished")
+            else:
+                print("[ERR] Unpack failed")
+            return
+
+        ok, out_dir = unpack_main(img, **opts)
         if ok:
             print("[OK] Unpack finished")
             print("Output:", out_dir)
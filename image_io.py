@@ -0,0 +1,1107 @@
+# Derived from https://github.com/cubinator/ext4
+# Original author: cubinator
+# License: GNU General Public License v3.0
+# Modifications: Input adapters that let ext4.Volume read packed images in place
+
+# pylint: disable=line-too-long
+from bisect import bisect_right
+from collections import OrderedDict
+import gzip
+import hashlib
+import io
+import json
+import lzma
+import os
+import struct
+import threading
+import zlib
+
+from ext4 import EndOfStreamError, Ext4Error, MagicError
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+try:
+    import lz4.frame as lz4_frame
+except ImportError:
+    lz4_frame = None
+
+
+class SparseImage(io.RawIOBase):
+    # Read-only, seekable view of an Android sparse image (simg) as the raw image it describes.
+    # RAW chunks are read from the sparse file, FILL and DONT_CARE chunks are synthesized without I/O.
+
+    MAGIC = 0xED26FF3A
+
+    CHUNK_TYPE_RAW = 0xCAC1
+    CHUNK_TYPE_FILL = 0xCAC2
+    CHUNK_TYPE_DONT_CARE = 0xCAC3
+    CHUNK_TYPE_CRC32 = 0xCAC4
+
+    # magic, major_version, minor_version, file_hdr_sz, chunk_hdr_sz, blk_sz, total_blks, total_chunks, image_checksum
+    FILE_HEADER = struct.Struct("<I4H4I")
+    # chunk_type, reserved, chunk_sz (blocks), total_sz (bytes, header included)
+    CHUNK_HEADER = struct.Struct("<2H2I")
+
+    def __init__(self, stream):
+        super().__init__()
+        self.stream = stream
+
+        header = stream.read(SparseImage.FILE_HEADER.size)
+        if len(header) != SparseImage.FILE_HEADER.size:
+            raise EndOfStreamError("Sparse image ended inside the file header.")
+
+        magic, self.major_version, self.minor_version, file_hdr_sz, chunk_hdr_sz, self.block_size, self.block_count, self.chunk_count, _ = SparseImage.FILE_HEADER.unpack(header)
+        if magic != SparseImage.MAGIC:
+            raise MagicError(f"Invalid sparse image magic: 0x{magic:08X} (expected 0x{SparseImage.MAGIC:08X})")
+        if self.major_version != 1:
+            raise Ext4Error(f"Unsupported sparse image version {self.major_version:d}.{self.minor_version:d}")
+
+        self.size = self.block_count * self.block_size
+
+        # Chunk index: output offsets of every chunk (searched with bisect) and (type, start, length, data) per chunk,
+        # data being the chunk's offset in the sparse file (RAW) or its 4 byte pattern (FILL)
+        self._chunk_starts = []
+        self._chunks = []
+        self._build_index(file_hdr_sz, chunk_hdr_sz)
+
+        self._position = 0
+        self._lock = threading.Lock()
+
+    def __repr__(self):
+        return f"{type(self).__name__:s}(size = {self.size!r:s}, block_size = {self.block_size!r:s}, chunk_count = {self.chunk_count!r:s})"
+
+    def _build_index(self, file_hdr_sz, chunk_hdr_sz):
+        stream = self.stream
+        source_offset = file_hdr_sz
+        output_offset = 0
+
+        for chunk_idx in range(self.chunk_count):
+            stream.seek(source_offset, io.SEEK_SET)
+            header = stream.read(chunk_hdr_sz)
+            if len(header) != chunk_hdr_sz:
+                raise EndOfStreamError(f"Sparse image ended inside the header of chunk {chunk_idx:d}.")
+
+            chunk_type, _, chunk_sz, total_sz = SparseImage.CHUNK_HEADER.unpack_from(header)
+            data_offset = source_offset + chunk_hdr_sz
+            data_len = total_sz - chunk_hdr_sz
+            chunk_len = chunk_sz * self.block_size
+
+            if chunk_type == SparseImage.CHUNK_TYPE_RAW:
+                if data_len != chunk_len:
+                    raise Ext4Error(f"Sparse image RAW chunk {chunk_idx:d} holds {data_len:d} bytes for {chunk_len:d} bytes of output.")
+                data = data_offset
+            elif chunk_type == SparseImage.CHUNK_TYPE_FILL:
+                data = stream.read(4)
+                if len(data) != 4:
+                    raise EndOfStreamError(f"Sparse image ended inside FILL chunk {chunk_idx:d}.")
+            elif chunk_type == SparseImage.CHUNK_TYPE_DONT_CARE:
+                data = None
+            elif chunk_type == SparseImage.CHUNK_TYPE_CRC32:
+                source_offset += total_sz
+                continue
+            else:
+                raise Ext4Error(f"Unknown sparse image chunk type 0x{chunk_type:04X} (chunk {chunk_idx:d}).")
+
+            if chunk_len:
+                self._chunk_starts.append(output_offset)
+                self._chunks.append((chunk_type, output_offset, chunk_len, data))
+            source_offset += total_sz
+            output_offset += chunk_len
+
+        if output_offset > self.size:
+            raise Ext4Error(f"Sparse image chunks describe {output_offset:d} bytes, header says {self.size:d}.")
+        if output_offset < self.size:
+            # Blocks not covered by any chunk read as zeros
+            self._chunk_starts.append(output_offset)
+            self._chunks.append((SparseImage.CHUNK_TYPE_DONT_CARE, output_offset, self.size - output_offset, None))
+
+    @staticmethod
+    def is_sparse(stream):
+        # Checks the magic at the stream's current position without moving it
+        position = stream.tell()
+        try:
+            magic = stream.read(4)
+        finally:
+            stream.seek(position, io.SEEK_SET)
+        return len(magic) == 4 and struct.unpack("<I", magic)[0] == SparseImage.MAGIC
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def tell(self):
+        return self._position
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        if whence == io.SEEK_SET:
+            position = offset
+        elif whence == io.SEEK_CUR:
+            position = self._position + offset
+        elif whence == io.SEEK_END:
+            position = self.size + offset
+        else:
+            raise ValueError(f"Invalid whence ({whence!r:s})")
+
+        if position < 0:
+            raise ValueError(f"Negative seek position {position:d}")
+        self._position = position
+        return position
+
+    def readinto(self, buffer):
+        buffer = memoryview(buffer).cast("B")
+
+        with self._lock:
+            position = self._position
+            end = min(self.size, position + len(buffer))
+            if position >= end:
+                return 0
+
+            done = 0
+            chunk_idx = bisect_right(self._chunk_starts, position) - 1
+            while position < end:
+                chunk_type, chunk_start, chunk_len, data = self._chunks[chunk_idx]
+                n = min(end, chunk_start + chunk_len) - position
+                piece = buffer[done:done + n]
+
+                if chunk_type == SparseImage.CHUNK_TYPE_RAW:
+                    self._read_source(data + position - chunk_start, piece)
+                elif chunk_type == SparseImage.CHUNK_TYPE_FILL:
+                    # The pattern repeats every 4 bytes from the start of the chunk
+                    phase = (position - chunk_start) % 4
+                    pattern = data[phase:] + data[:phase]
+                    piece[:] = (pattern * (n // 4 + 1))[:n]
+                else:
+                    piece[:] = bytes(n)
+
+                position += n
+                done += n
+                chunk_idx += 1
+
+            self._position = position
+            return done
+
+    def _read_source(self, offset, buffer):
+        self.stream.seek(offset, io.SEEK_SET)
+        received = 0
+        while received < len(buffer):
+            n = self.stream.readinto(buffer[received:])
+            if not n:
+                raise EndOfStreamError(f"Sparse image ended {len(buffer) - received:d} bytes inside a RAW chunk.")
+            received += n
+
+    def close(self):
+        if not self.closed:
+            self.stream.close()
+        super().close()
+
+
+def _read_varint(data, offset):
+    # xz multibyte integer (7 bits per byte, little endian)
+    value = shift = 0
+    while True:
+        byte = data[offset]
+        offset += 1
+        value |= (byte & 0x7F) << shift
+        if byte < 0x80:
+            return value, offset
+        shift += 7
+        if shift > 63:
+            raise Ext4Error("Invalid xz variable-length integer")
+
+
+class _ZlibDecoder:
+    # zlib decompressobj behind the needs_input / eof interface of lzma and lz4.frame. Its state can be copied,
+    # which is what makes in-memory checkpoints inside a single gzip member possible.
+
+    def __init__(self, decompressor=None, tail=b""):
+        self._decompressor = decompressor if decompressor is not None else zlib.decompressobj(wbits=31)
+        self._tail = tail
+
+    @property
+    def needs_input(self):
+        return not self._tail
+
+    @property
+    def eof(self):
+        return self._decompressor.eof
+
+    @property
+    def unused_data(self):
+        return self._decompressor.unused_data
+
+    def decompress(self, data, max_length):
+        data = self._tail + data if self._tail else data
+        result = self._decompressor.decompress(data, max_length)
+        self._tail = self._decompressor.unconsumed_tail
+        return result
+
+    def copy(self):
+        return _ZlibDecoder(self._decompressor.copy(), self._tail)
+
+
+class _ZstdDecoder:
+    # zstandard's decompressobj has no max_length; input is fed in small slices so every call stays bounded
+
+    FEED_SIZE = 4096
+
+    def __init__(self):
+        self._decompressor = zstandard.ZstdDecompressor().decompressobj()
+        self._tail = b""
+
+    @property
+    def needs_input(self):
+        return not self._tail
+
+    @property
+    def eof(self):
+        return self._decompressor.eof
+
+    @property
+    def unused_data(self):
+        return self._decompressor.unused_data
+
+    def decompress(self, data, max_length):
+        data = self._tail + data if self._tail else data
+        pieces = []
+        received = offset = 0
+        while offset < len(data) and received < max_length and not self._decompressor.eof:
+            piece = self._decompressor.decompress(data[offset:offset + _ZstdDecoder.FEED_SIZE])
+            offset += _ZstdDecoder.FEED_SIZE
+            pieces.append(piece)
+            received += len(piece)
+        self._tail = data[offset:] if not self._decompressor.eof else b""
+        return b"".join(pieces)
+
+
+class CompressedImage(io.RawIOBase):
+    # Read-only, seekable view of a gzip / xz / zstd / lz4 compressed image.
+    #
+    # The image is split into units that decompress independently (gzip members, xz blocks, zstd and lz4 frames).
+    # Their positions are found once (from the xz index or the zstd seek table when present, by walking the frame
+    # headers or decompressing the file otherwise) and cached in a small JSON file next to the image. A read only
+    # decompresses from the closest unit start, or from an in-memory checkpoint inside a gzip member, and the
+    # decompressed pages are kept in an LRU cache.
+
+    CODECS = (
+        ("gzip", b"\x1f\x8b"),
+        ("xz", b"\xfd7zXZ\x00"),
+        ("zstd", b"\x28\xb5\x2f\xfd"),
+        ("lz4", b"\x04\x22\x4d\x18"),
+    )
+    SUFFIXES = (".gz", ".xz", ".zst", ".zstd", ".lz4")
+    INDEX_SUFFIX = ".seekidx"
+    INDEX_VERSION = 1
+
+    PAGE_SIZE = 1 << 20
+    READ_SIZE = 1 << 16
+
+    ZSTD_MAGIC = 0xFD2FB528
+    ZSTD_SEEKABLE_MAGIC = 0x8F92EAB1
+    LZ4_MAGIC = 0x184D2204
+    SKIPPABLE_MAGIC_MASK = 0xFFFFFFF0
+    SKIPPABLE_MAGIC = 0x184D2A50
+
+    def __init__(self, stream, codec, index_path=None, cache_size=64 << 20, checkpoint_interval=16 << 20, save_index=True):
+        super().__init__()
+        if codec == "zstd" and zstandard is None:
+            raise Ext4Error("Reading zstd compressed images needs the 'zstandard' package")
+        if codec == "lz4" and lz4_frame is None:
+            raise Ext4Error("Reading lz4 compressed images needs the 'lz4' package")
+        if codec not in dict(CompressedImage.CODECS):
+            raise ValueError(f"Unknown codec {codec!r:s} (expected one of {', '.join(name for name, _ in CompressedImage.CODECS):s})")
+
+        self.stream = stream
+        self.codec = codec
+        self.index_path = index_path
+        self.source_size = stream.seek(0, io.SEEK_END)
+
+        try:
+            self._source_mtime = os.fstat(stream.fileno()).st_mtime_ns
+        except (AttributeError, io.UnsupportedOperation, OSError):
+            self._source_mtime = None
+
+        # Units as (compressed start, compressed end, uncompressed start), uncompressed starts searched with bisect
+        units = self._load_index()
+        self.index_cached = units is not None
+        if units is None:
+            units, self.size = self._scan()
+            # A freshly built index stays in memory unless the caller asked for it to be written to index_path
+            if save_index:
+                self._save_index(units)
+        self._units = units
+        self._unit_starts = [unit[2] for unit in units]
+
+        # Decoder states inside a unit (gzip only), taken every checkpoint_interval bytes of output
+        self.checkpoint_interval = max(CompressedImage.PAGE_SIZE, checkpoint_interval // CompressedImage.PAGE_SIZE * CompressedImage.PAGE_SIZE)
+        self._checkpoint_starts = []
+        self._checkpoints = []
+
+        self.max_pages = max(4, cache_size // CompressedImage.PAGE_SIZE)
+        self._pages = OrderedDict()
+        self._cursor = None
+
+        self.hits = 0
+        self.misses = 0
+        self.restarts = 0
+
+        self._position = 0
+        self._lock = threading.Lock()
+
+    def __repr__(self):
+        return f"{type(self).__name__:s}(codec = {self.codec!r:s}, size = {self.size!r:s}, units = {self.unit_count!r:s}, hits = {self.hits!r:s}, misses = {self.misses!r:s}, restarts = {self.restarts!r:s})"
+
+    @property
+    def unit_count(self):
+        return len(self._units)
+
+    @staticmethod
+    def detect_codec(stream):
+        # Compression format from the magic at the stream's current position, None for anything else
+        position = stream.tell()
+        try:
+            magic = stream.read(8)
+        finally:
+            stream.seek(position, io.SEEK_SET)
+
+        for codec, codec_magic in CompressedImage.CODECS:
+            if magic.startswith(codec_magic):
+                return codec
+        return None
+
+    def stats(self):
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "restarts": self.restarts,
+            "checkpoints": len(self._checkpoints),
+            "cached_pages": len(self._pages),
+        }
+
+    # ---- Index ----
+
+    def _load_index(self):
+        if self.index_path is None:
+            return None
+
+        try:
+            with open(self.index_path, "r", encoding="utf-8") as f:
+                index = json.load(f)
+        except (OSError, ValueError):
+            return None
+
+        if not isinstance(index, dict) or index.get("version") != CompressedImage.INDEX_VERSION or index.get("codec") != self.codec:
+            return None
+        if index.get("source_size") != self.source_size or index.get("source_mtime") != self._source_mtime:
+            return None
+
+        self.size = index["size"]
+        return [tuple(unit) for unit in index["units"]]
+
+    def _save_index(self, units):
+        if self.index_path is None:
+            return
+
+        index = {
+            "version": CompressedImage.INDEX_VERSION,
+            "codec": self.codec,
+            "source_size": self.source_size,
+            "source_mtime": self._source_mtime,
+            "size": self.size,
+            "units": units,
+        }
+        try:
+            with open(self.index_path, "w", encoding="utf-8") as f:
+                json.dump(index, f, separators=(",", ":"))
+        except OSError:
+            # Read-only location: the index is rebuilt on the next open
+            pass
+
+    def _scan(self):
+        if self.codec == "gzip":
+            units = self._scan_gzip()
+        elif self.codec == "xz":
+            units = self._scan_xz()
+        elif self.codec == "zstd":
+            units = self._scan_zstd_seek_table()
+            if units is None:
+                units = self._scan_frames(self._zstd_frame_end, _ZstdDecoder)
+        else:
+            units = self._scan_frames(self._lz4_frame_end, lz4_frame.LZ4FrameDecompressor)
+
+        # (compressed start, compressed end, uncompressed length) -> (compressed start, compressed end, uncompressed start)
+        result = []
+        out_position = 0
+        for comp_start, comp_end, out_len in units:
+            if out_len:
+                result.append((comp_start, comp_end, out_position))
+                out_position += out_len
+        return result, out_position
+
+    def _scan_gzip(self):
+        # Member boundaries and sizes are only known after decompressing (ISIZE is modulo 2**32)
+        units = []
+        comp_position = 0
+        while comp_position < self.source_size and self._read_source(comp_position, 2) == b"\x1f\x8b":
+            out_len, comp_end = self._decode_unit(_ZlibDecoder(), comp_position, self.source_size)
+            units.append((comp_position, comp_end, out_len))
+            comp_position = comp_end
+        return units
+
+    def _scan_xz(self):
+        # Walks the streams backwards through their footers and indexes; nothing is decompressed
+        streams = []
+        position = self.source_size
+        while position > 0:
+            while position >= 4 and self._read_source(position - 4, 4) == b"\0\0\0\0":
+                position -= 4  # Stream padding
+
+            footer = self._read_source(position - 12, 12)
+            if len(footer) != 12 or footer[10:12] != b"YZ":
+                raise MagicError(f"Invalid xz stream footer at offset {position - 12:d}")
+
+            index_size = (struct.unpack_from("<I", footer, 4)[0] + 1) * 4
+            index_start = position - 12 - index_size
+            index = self._read_source(index_start, index_size)
+            if index[0] != 0:
+                raise Ext4Error(f"Invalid xz index at offset {index_start:d}")
+
+            record_count, offset = _read_varint(index, 1)
+            records = []
+            for _ in range(record_count):
+                unpadded_size, offset = _read_varint(index, offset)
+                uncompressed_size, offset = _read_varint(index, offset)
+                records.append((unpadded_size, uncompressed_size))
+
+            stream_start = index_start - sum((unpadded_size + 3) & ~3 for unpadded_size, _ in records) - 12
+            if stream_start < 0 or self._read_source(stream_start, 6) != b"\xfd7zXZ\x00":
+                raise MagicError(f"Invalid xz stream header at offset {stream_start:d}")
+
+            block_start = stream_start + 12
+            stream_units = []
+            for unpadded_size, uncompressed_size in records:
+                stream_units.append((block_start, block_start + unpadded_size, uncompressed_size))
+                block_start += (unpadded_size + 3) & ~3
+            streams.append(stream_units)
+            position = stream_start
+
+        return [unit for stream_units in reversed(streams) for unit in stream_units]
+
+    def _scan_zstd_seek_table(self):
+        # Seekable zstd format: a skippable frame at the end lists the compressed and decompressed size of every frame
+        if self.source_size < 9:
+            return None
+        frame_count, descriptor, magic = struct.unpack("<IBI", self._read_source(self.source_size - 9, 9))
+        if magic != CompressedImage.ZSTD_SEEKABLE_MAGIC:
+            return None
+
+        entry_size = 12 if descriptor & 0x80 else 8
+        table_start = self.source_size - 9 - frame_count * entry_size
+        table = self._read_source(table_start, frame_count * entry_size)
+
+        units = []
+        comp_position = 0
+        for entry_idx in range(frame_count):
+            comp_len, out_len = struct.unpack_from("<2I", table, entry_idx * entry_size)
+            units.append((comp_position, comp_position + comp_len, out_len))
+            comp_position += comp_len
+        return units
+
+    def _scan_frames(self, frame_end, decoder_class):
+        # Frame boundaries come from the headers; frames that do not record their content size are decompressed
+        units = []
+        comp_position = 0
+        while comp_position + 8 <= self.source_size:
+            magic, skip_len = struct.unpack("<2I", self._read_source(comp_position, 8))
+            if magic & CompressedImage.SKIPPABLE_MAGIC_MASK == CompressedImage.SKIPPABLE_MAGIC:
+                comp_position += 8 + skip_len
+                continue
+
+            comp_end, out_len = frame_end(comp_position)
+            if out_len is None:
+                out_len, _ = self._decode_unit(decoder_class(), comp_position, comp_end)
+            units.append((comp_position, comp_end, out_len))
+            comp_position = comp_end
+        return units
+
+    def _zstd_frame_end(self, position):
+        header = self._read_source(position, 18)
+        if struct.unpack_from("<I", header)[0] != CompressedImage.ZSTD_MAGIC:
+            raise MagicError(f"Invalid zstd frame magic at offset {position:d}")
+
+        descriptor = header[4]
+        single_segment = (descriptor >> 5) & 1
+        content_size_len = (1 if single_segment else 0, 2, 4, 8)[descriptor >> 6]
+        offset = 5 + (0 if single_segment else 1) + (0, 1, 2, 4)[descriptor & 3]
+
+        out_len = None
+        if content_size_len:
+            out_len = int.from_bytes(header[offset:offset + content_size_len], "little")
+            if content_size_len == 2:
+                out_len += 256
+
+        # Block headers: last block flag, block type, block size (RLE blocks store a single byte)
+        position += offset + content_size_len
+        while True:
+            block_header = self._read_source(position, 3)
+            if len(block_header) != 3:
+                raise EndOfStreamError(f"zstd frame ended inside a block header at offset {position:d}")
+            block_header = int.from_bytes(block_header, "little")
+            block_type = (block_header >> 1) & 3
+            position += 3 + (1 if block_type == 1 else block_header >> 3)
+            if block_header & 1:
+                break
+
+        if descriptor & 0x04:
+            position += 4  # Content checksum
+        return position, out_len
+
+    def _lz4_frame_end(self, position):
+        header = self._read_source(position, 19)
+        if struct.unpack_from("<I", header)[0] != CompressedImage.LZ4_MAGIC:
+            raise MagicError(f"Invalid lz4 frame magic at offset {position:d}")
+
+        flags = header[4]
+        offset = 6
+        out_len = None
+        if flags & 0x08:
+            out_len, = struct.unpack_from("<Q", header, offset)
+            offset += 8
+        if flags & 0x01:
+            offset += 4  # Dictionary id
+        position += offset + 1  # Header checksum
+
+        block_checksum = 4 if flags & 0x10 else 0
+        while True:
+            block_size = self._read_source(position, 4)
+            if len(block_size) != 4:
+                raise EndOfStreamError(f"lz4 frame ended inside a block header at offset {position:d}")
+            block_size, = struct.unpack("<I", block_size)
+            position += 4
+            if block_size == 0:
+                break
+            position += (block_size & 0x7FFFFFFF) + block_checksum
+
+        if flags & 0x04:
+            position += 4  # Content checksum
+        return position, out_len
+
+    # ---- Decompression ----
+
+    def _read_source(self, offset, byte_len):
+        self.stream.seek(offset, io.SEEK_SET)
+        return self.stream.read(byte_len)
+
+    def _new_decoder(self, unit_idx):
+        # Decoder for a unit and the compressed offset its input starts at
+        comp_start = self._units[unit_idx][0]
+        if self.codec == "gzip":
+            return _ZlibDecoder(), comp_start
+        if self.codec == "zstd":
+            return _ZstdDecoder(), comp_start
+        if self.codec == "lz4":
+            return lz4_frame.LZ4FrameDecompressor(), comp_start
+
+        # xz block: the header lists the filter chain, the data after it is a raw filter stream
+        header_size = (self._read_source(comp_start, 1)[0] + 1) * 4
+        header = self._read_source(comp_start, header_size)
+        flags = header[1]
+        offset = 2
+        if flags & 0x40:
+            _, offset = _read_varint(header, offset)  # Compressed size
+        if flags & 0x80:
+            _, offset = _read_varint(header, offset)  # Uncompressed size
+
+        filters = []
+        for _ in range((flags & 0x03) + 1):
+            filter_id, offset = _read_varint(header, offset)
+            properties_size, offset = _read_varint(header, offset)
+            filters.append(lzma._decode_filter_properties(filter_id, header[offset:offset + properties_size]))
+            offset += properties_size
+        return lzma.LZMADecompressor(format=lzma.FORMAT_RAW, filters=filters), comp_start + header_size
+
+    def _decode_step(self, decoder, comp_position, comp_end):
+        # One bounded decompression step: (output, new compressed position)
+        if decoder.needs_input and comp_position < comp_end:
+            data = self._read_source(comp_position, min(CompressedImage.READ_SIZE, comp_end - comp_position))
+            if not data:
+                raise EndOfStreamError(f"Compressed image ended at offset {comp_position:d}")
+            comp_position += len(data)
+        else:
+            data = b""
+
+        result = decoder.decompress(data, CompressedImage.PAGE_SIZE)
+        if not result and not decoder.eof and decoder.needs_input and comp_position >= comp_end:
+            raise EndOfStreamError(f"Compressed unit ended before its end marker at offset {comp_position:d}")
+        return result, comp_position
+
+    def _decode_unit(self, decoder, comp_position, comp_end):
+        # Decompresses a whole unit without keeping the output: (uncompressed length, compressed end)
+        out_len = 0
+        while not decoder.eof:
+            result, comp_position = self._decode_step(decoder, comp_position, comp_end)
+            out_len += len(result)
+        return out_len, comp_position - len(getattr(decoder, "unused_data", None) or b"")
+
+    def _restart(self, position):
+        # New cursor at the closest unit start or checkpoint at or before position
+        unit_idx = bisect_right(self._unit_starts, position) - 1
+        checkpoint_idx = bisect_right(self._checkpoint_starts, position) - 1
+        self.restarts += 1
+
+        if checkpoint_idx >= 0 and self._checkpoint_starts[checkpoint_idx] >= self._unit_starts[unit_idx]:
+            unit_idx, comp_position, decoder, buffer_start, buffer = self._checkpoints[checkpoint_idx]
+            return _Cursor(unit_idx, comp_position, decoder.copy(), buffer_start, bytearray(buffer))
+
+        decoder, comp_position = self._new_decoder(unit_idx)
+        return _Cursor(unit_idx, comp_position, decoder, self._unit_starts[unit_idx], bytearray())
+
+    def _load_page(self, page_idx):
+        page_size = CompressedImage.PAGE_SIZE
+        position = page_idx * page_size
+
+        cursor = self._cursor
+        unit_idx = bisect_right(self._unit_starts, position) - 1
+        if cursor is None or cursor.buffer_start > position or cursor.buffer_start < self._unit_starts[unit_idx] or position - cursor.buffer_start > self.checkpoint_interval:
+            cursor = self._cursor = self._restart(position)
+
+        page = None
+        while page is None:
+            if cursor.unit_idx >= len(self._units):
+                raise EndOfStreamError(f"Compressed image ended before offset {position:d}")
+
+            comp_end = self._units[cursor.unit_idx][1]
+            if cursor.decoder.eof:
+                cursor.unit_idx += 1
+                if cursor.unit_idx < len(self._units):
+                    cursor.decoder, cursor.comp_position = self._new_decoder(cursor.unit_idx)
+                elif cursor.buffer and cursor.buffer_start % page_size == 0:
+                    # Short last page
+                    last_page = bytes(cursor.buffer)
+                    self._put_page(cursor.buffer_start // page_size, last_page)
+                    if cursor.buffer_start == position:
+                        page = last_page
+                    cursor.buffer_start += len(cursor.buffer)
+                    del cursor.buffer[:]
+                continue
+
+            result, cursor.comp_position = self._decode_step(cursor.decoder, cursor.comp_position, comp_end)
+            cursor.buffer += result
+            page = self._harvest(cursor, page_idx)
+
+        return page
+
+    def _harvest(self, cursor, page_idx):
+        # Moves every complete page out of the cursor's buffer into the cache, returns page page_idx if it was one
+        # of them (a single step can produce more pages than the cache holds)
+        page_size = CompressedImage.PAGE_SIZE
+        buffer = cursor.buffer
+
+        head = -cursor.buffer_start % page_size
+        if head:
+            # Output before the first page boundary (a unit started mid-page) belongs to the previous unit's pages
+            if len(buffer) < head:
+                return None
+            del buffer[:head]
+            cursor.buffer_start += head
+
+        wanted = None
+        offset = 0
+        while len(buffer) - offset >= page_size:
+            page = bytes(buffer[offset:offset + page_size])
+            if cursor.buffer_start // page_size == page_idx:
+                wanted = page
+            self._put_page(cursor.buffer_start // page_size, page)
+            offset += page_size
+            cursor.buffer_start += page_size
+
+            if hasattr(cursor.decoder, "copy") and cursor.buffer_start % self.checkpoint_interval == 0:
+                checkpoint_idx = bisect_right(self._checkpoint_starts, cursor.buffer_start)
+                if checkpoint_idx == 0 or self._checkpoint_starts[checkpoint_idx - 1] != cursor.buffer_start:
+                    self._checkpoint_starts.insert(checkpoint_idx, cursor.buffer_start)
+                    self._checkpoints.insert(checkpoint_idx, (cursor.unit_idx, cursor.comp_position, cursor.decoder.copy(), cursor.buffer_start, bytes(buffer[offset:])))
+
+        del buffer[:offset]
+        return wanted
+
+    def _put_page(self, page_idx, page):
+        self._pages[page_idx] = page
+        self._pages.move_to_end(page_idx)
+        while len(self._pages) > self.max_pages:
+            self._pages.popitem(last=False)
+
+    def _get_page(self, page_idx):
+        page = self._pages.get(page_idx)
+        if page is not None:
+            self._pages.move_to_end(page_idx)
+            self.hits += 1
+            return page
+
+        self.misses += 1
+        return self._load_page(page_idx)
+
+    # ---- Stream interface ----
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def tell(self):
+        return self._position
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        if whence == io.SEEK_SET:
+            position = offset
+        elif whence == io.SEEK_CUR:
+            position = self._position + offset
+        elif whence == io.SEEK_END:
+            position = self.size + offset
+        else:
+            raise ValueError(f"Invalid whence ({whence!r:s})")
+
+        if position < 0:
+            raise ValueError(f"Negative seek position {position:d}")
+        self._position = position
+        return position
+
+    def readinto(self, buffer):
+        buffer = memoryview(buffer).cast("B")
+        page_size = CompressedImage.PAGE_SIZE
+
+        with self._lock:
+            position = self._position
+            end = min(self.size, position + len(buffer))
+
+            done = 0
+            while position < end:
+                page_idx, page_offset = divmod(position, page_size)
+                page = self._get_page(page_idx)
+                n = min(end - position, len(page) - page_offset)
+                buffer[done:done + n] = page[page_offset:page_offset + n]
+                position += n
+                done += n
+
+            self._position = position
+            return done
+
+    def close(self):
+        if not self.closed:
+            self._pages.clear()
+            self._checkpoints.clear()
+            self.stream.close()
+        super().close()
+
+
+class _Cursor:
+    # Decompression position: unit, compressed offset of the next input and output not yet cut into pages
+    __slots__ = ("unit_idx", "comp_position", "decoder", "buffer_start", "buffer")
+
+    def __init__(self, unit_idx, comp_position, decoder, buffer_start, buffer):
+        self.unit_idx = unit_idx
+        self.comp_position = comp_position
+        self.decoder = decoder
+        self.buffer_start = buffer_start
+        self.buffer = buffer
+
+
+class LpPartition:
+    # Logical partition of a super image; extents are (target type, logical offset, length, physical offset,
+    # block device index) in bytes
+
+    def __init__(self, name, attributes, group_name, extents):
+        self.name = name
+        self.attributes = attributes
+        self.group_name = group_name
+        self.extents = extents
+
+    def __repr__(self):
+        return f"{type(self).__name__:s}(name = {self.name!r:s}, group_name = {self.group_name!r:s}, size = {self.size!r:s}, extents = {len(self.extents)!r:s})"
+
+    @property
+    def size(self):
+        return sum(extent[2] for extent in self.extents)
+
+    @property
+    def is_readonly(self):
+        return (self.attributes & LpMetadata.PARTITION_ATTR_READONLY) != 0
+
+    def open(self, stream):
+        # (stream, offset) for ext4.Volume: a partition made of one linear extent is read straight from the super
+        # image (mmap, pread and kernel copies stay available), anything else through a PartitionStream
+        for target_type, _, _, _, block_device_idx in self.extents:
+            if target_type == LpMetadata.TARGET_TYPE_LINEAR and block_device_idx != 0:
+                raise Ext4Error(f"Partition {self.name!r:s} has extents on block device {block_device_idx:d}, only the super image itself can be read")
+
+        if len(self.extents) == 1 and self.extents[0][0] == LpMetadata.TARGET_TYPE_LINEAR:
+            return stream, self.extents[0][3]
+        return PartitionStream(stream, self.extents), 0
+
+
+class LpMetadata:
+    # Logical partition (LP) metadata of an Android super image: geometry, then the partition, extent, group and
+    # block device tables of one metadata slot. Checksums are verified; the backup copies are used when the
+    # primary ones are damaged.
+
+    SECTOR_SIZE = 512
+    RESERVED_BYTES = 4096
+    GEOMETRY_SIZE = 4096
+
+    GEOMETRY_MAGIC = 0x616C4467
+    HEADER_MAGIC = 0x414C5030
+    MAJOR_VERSION = 10
+
+    TARGET_TYPE_LINEAR = 0
+    TARGET_TYPE_ZERO = 1
+
+    PARTITION_ATTR_READONLY = 0x1
+
+    # magic, struct_size, checksum, metadata_max_size, metadata_slot_count, logical_block_size
+    GEOMETRY = struct.Struct("<2I32s3I")
+    # magic, major_version, minor_version, header_size, header_checksum, tables_size, tables_checksum,
+    # then (offset, num_entries, entry_size) of the partition, extent, group and block device tables
+    HEADER = struct.Struct("<I2HI32sI32s12I")
+    # name, attributes, first_extent_index, num_extents, group_index
+    PARTITION = struct.Struct("<36s4I")
+    # num_sectors, target_type, target_data, target_source
+    EXTENT = struct.Struct("<QIQI")
+    # name, flags, maximum_size
+    GROUP = struct.Struct("<36sIQ")
+    # first_logical_sector, alignment, alignment_offset, size, partition_name, flags
+    BLOCK_DEVICE = struct.Struct("<Q2IQ36sI")
+
+    def __init__(self, stream, slot=0):
+        self.stream = stream
+        self.slot = slot
+
+        self.metadata_max_size, self.metadata_slot_count, self.logical_block_size = self._read_geometry()
+        if not 0 <= slot < self.metadata_slot_count:
+            raise ValueError(f"Metadata slot {slot:d} out of range (super image has {self.metadata_slot_count:d} slots)")
+
+        # Primary slots follow the two geometry copies, the backup slots follow the primary ones
+        primary_offset = LpMetadata.RESERVED_BYTES + 2 * LpMetadata.GEOMETRY_SIZE
+        backup_offset = primary_offset + self.metadata_slot_count * self.metadata_max_size
+        try:
+            self._read_metadata(primary_offset + slot * self.metadata_max_size)
+        except Ext4Error:
+            self._read_metadata(backup_offset + slot * self.metadata_max_size)
+
+    def __repr__(self):
+        return f"{type(self).__name__:s}(version = {self.major_version:d}.{self.minor_version:d}, slot = {self.slot!r:s}, partitions = {[partition.name for partition in self.partitions]!r:s})"
+
+    @staticmethod
+    def is_super(stream):
+        # Checks for the geometry magic behind the reserved area without moving the stream
+        position = stream.tell()
+        try:
+            stream.seek(LpMetadata.RESERVED_BYTES, io.SEEK_SET)
+            magic = stream.read(4)
+        finally:
+            stream.seek(position, io.SEEK_SET)
+        return len(magic) == 4 and struct.unpack("<I", magic)[0] == LpMetadata.GEOMETRY_MAGIC
+
+    def _read(self, offset, byte_len):
+        self.stream.seek(offset, io.SEEK_SET)
+        data = self.stream.read(byte_len)
+        if len(data) != byte_len:
+            raise EndOfStreamError(f"Super image ended {byte_len - len(data):d} bytes before the end of its metadata.")
+        return data
+
+    def _read_geometry(self):
+        for offset in (LpMetadata.RESERVED_BYTES, LpMetadata.RESERVED_BYTES + LpMetadata.GEOMETRY_SIZE):
+            raw = self._read(offset, LpMetadata.GEOMETRY.size)
+            magic, struct_size, checksum, metadata_max_size, metadata_slot_count, logical_block_size = LpMetadata.GEOMETRY.unpack(raw)
+            if magic != LpMetadata.GEOMETRY_MAGIC or struct_size != LpMetadata.GEOMETRY.size:
+                continue
+            if hashlib.sha256(raw[:8] + bytes(32) + raw[40:]).digest() != checksum:
+                continue
+            return metadata_max_size, metadata_slot_count, logical_block_size
+
+        raise MagicError("No valid LP metadata geometry found (not a super image?)")
+
+    def _read_metadata(self, offset):
+        header = self._read(offset, LpMetadata.HEADER.size)
+        magic, self.major_version, self.minor_version, header_size, header_checksum, tables_size, tables_checksum, *tables = LpMetadata.HEADER.unpack(header)
+        if magic != LpMetadata.HEADER_MAGIC:
+            raise MagicError(f"Invalid LP metadata header magic: 0x{magic:08X} (expected 0x{LpMetadata.HEADER_MAGIC:08X})")
+        if self.major_version != LpMetadata.MAJOR_VERSION:
+            raise Ext4Error(f"Unsupported LP metadata version {self.major_version:d}.{self.minor_version:d}")
+
+        header = self._read(offset, header_size)
+        if hashlib.sha256(header[:12] + bytes(32) + header[44:]).digest() != header_checksum:
+            raise Ext4Error(f"LP metadata header checksum mismatch at offset {offset:d}")
+
+        raw_tables = self._read(offset + header_size, tables_size)
+        if hashlib.sha256(raw_tables).digest() != tables_checksum:
+            raise Ext4Error(f"LP metadata tables checksum mismatch at offset {offset:d}")
+
+        def entries(table_idx, structure):
+            table_offset, entry_count, entry_size = tables[3 * table_idx: 3 * table_idx + 3]
+            return [structure.unpack_from(raw_tables, table_offset + entry_idx * entry_size) for entry_idx in range(entry_count)]
+
+        def name(raw_name):
+            return raw_name.split(b"\0", 1)[0].decode("utf-8", errors="replace")
+
+        extents = entries(1, LpMetadata.EXTENT)
+        self.groups = [name(raw_name) for raw_name, _, _ in entries(2, LpMetadata.GROUP)]
+        self.block_devices = [name(partition_name) for _, _, _, _, partition_name, _ in entries(3, LpMetadata.BLOCK_DEVICE)]
+
+        self.partitions = []
+        for raw_name, attributes, first_extent_idx, extent_count, group_idx in entries(0, LpMetadata.PARTITION):
+            partition_extents = []
+            logical_offset = 0
+            for num_sectors, target_type, target_data, target_source in extents[first_extent_idx:first_extent_idx + extent_count]:
+                length = num_sectors * LpMetadata.SECTOR_SIZE
+                partition_extents.append((target_type, logical_offset, length, target_data * LpMetadata.SECTOR_SIZE, target_source))
+                logical_offset += length
+            group_name = self.groups[group_idx] if group_idx < len(self.groups) else None
+            self.partitions.append(LpPartition(name(raw_name), attributes, group_name, partition_extents))
+
+    def get_partition(self, name):
+        for partition in self.partitions:
+            if partition.name == name:
+                return partition
+        raise KeyError(f"No logical partition named {name!r:s} (super image has {', '.join(partition.name for partition in self.partitions):s})")
+
+
+class PartitionStream(io.RawIOBase):
+    # Read-only, seekable view of a logical partition made of several extents; ZERO extents read as zeros.
+    # The super image stream is shared, not owned: closing the partition leaves it open.
+
+    def __init__(self, stream, extents):
+        super().__init__()
+        self.stream = stream
+        self.size = sum(extent[2] for extent in extents)
+
+        self._extents = [extent for extent in extents if extent[2]]
+        self._extent_starts = [extent[1] for extent in self._extents]
+
+        self._position = 0
+        self._lock = threading.Lock()
+
+    def __repr__(self):
+        return f"{type(self).__name__:s}(size = {self.size!r:s}, extents = {len(self._extents)!r:s})"
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def tell(self):
+        return self._position
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        if whence == io.SEEK_SET:
+            position = offset
+        elif whence == io.SEEK_CUR:
+            position = self._position + offset
+        elif whence == io.SEEK_END:
+            position = self.size + offset
+        else:
+            raise ValueError(f"Invalid whence ({whence!r:s})")
+
+        if position < 0:
+            raise ValueError(f"Negative seek position {position:d}")
+        self._position = position
+        return position
+
+    def readinto(self, buffer):
+        buffer = memoryview(buffer).cast("B")
+
+        with self._lock:
+            position = self._position
+            end = min(self.size, position + len(buffer))
+
+            done = 0
+            extent_idx = bisect_right(self._extent_starts, position) - 1
+            while position < end:
+                target_type, extent_start, extent_len, source_offset, _ = self._extents[extent_idx]
+                n = min(end, extent_start + extent_len) - position
+                piece = buffer[done:done + n]
+
+                if target_type == LpMetadata.TARGET_TYPE_LINEAR:
+                    self.stream.seek(source_offset + position - extent_start, io.SEEK_SET)
+                    received = 0
+                    while received < n:
+                        count = self.stream.readinto(piece[received:])
+                        if not count:
+                            raise EndOfStreamError(f"Super image ended {n - received:d} bytes inside a partition extent.")
+                        received += count
+                else:
+                    piece[:] = bytes(n)
+
+                position += n
+                done += n
+                extent_idx += 1
+
+            self._position = position
+            return done
+
+
+def open_image(path, cache_size=64 << 20, save_index=False):
+    # Raw images stay plain files (mmap, pread and kernel copies remain available). Compressed images are wrapped
+    # in a CompressedImage (cache_size bounds its decompressed page cache), sparse images, compressed or not, in a
+    # SparseImage. An existing <image>.seekidx unit index is always used; a new one is only written next to the
+    # image with save_index, so read-only callers never create files beside the input.
+    stream = open(path, "rb")
+    try:
+        codec = CompressedImage.detect_codec(stream)
+        if codec is not None:
+            stream = CompressedImage(stream, codec, index_path=path + CompressedImage.INDEX_SUFFIX, cache_size=cache_size,
+                                     save_index=save_index)
+        if SparseImage.is_sparse(stream):
+            stream = SparseImage(stream)
+    except BaseException:
+        stream.close()
+        raise
+    return stream
+
+
+def read_image_head(path, byte_len):
+    # First byte_len bytes of the image as open_image would decompress them, without building a CompressedImage
+    # unit index: compressed images are only decoded from the start as far as needed. Sparse images are returned
+    # as stored (check SparseImage.is_sparse on the result).
+    with open(path, "rb") as stream:
+        codec = CompressedImage.detect_codec(stream)
+        if codec is None:
+            return stream.read(byte_len)
+
+        if codec == "gzip":
+            reader = gzip.GzipFile(fileobj=stream)
+        elif codec == "xz":
+            reader = lzma.LZMAFile(stream)
+        elif codec == "zstd":
+            if zstandard is None:
+                raise Ext4Error("Reading zstd compressed images needs the 'zstandard' package")
+            reader = zstandard.ZstdDecompressor().stream_reader(stream, read_across_frames=True)
+        else:
+            if lz4_frame is None:
+                raise Ext4Error("Reading lz4 compressed images needs the 'lz4' package")
+            reader = lz4_frame.LZ4FrameFile(stream)
+
+        with reader:
+            chunks = []
+            received = 0
+            while received < byte_len:
+                data = reader.read(byte_len - received)
+                if not data:
+                    break
+                chunks.append(data)
+                received += len(data)
+        return b"".join(chunks)
+
+
+def image_stem(path):
+    # "system.img.xz" -> "system"
+    name = os.path.basename(path)
+    for suffix in CompressedImage.SUFFIXES:
+        if name.lower().endswith(suffix):
+            name = name[:-len(suffix)]
+            break
+    return os.path.splitext(name)[0]
@@ -4,12 +4,24 @@
 # Modifications: Split into standalone utility
 
 
+import io
 import os
 import sys
 import re
+import queue
+import fnmatch
+import contextlib
+import collections
+import multiprocessing.util
+import shutil
 import struct
+import threading
+import time
+import glob
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 from check import detect_type
-import ext4, ext3, ext2   # asumsi 3 file udah ada
+import ext4
+from image_io import CompressedImage, LpMetadata, SparseImage, image_stem, open_image, read_image_head
 
 # Force UTF-8 on stdout/stderr so non-ASCII paths don't crash the Windows console.
 for _s in (sys.stdout, sys.stderr):
@@ -19,18 +31,31 @@ for _s in (sys.stdout, sys.stderr):
         pass
 
 # === CONFIG DASAR ===
-Volume = None  # akan di-set runtime
+# Default buat Unpacker; tiap Unpacker bawa opsinya sendiri (satu engine buat EXT2/3/4,
+# extent / inline / block map dipilih per inode)
 
 base = os.path.dirname(__file__)
 # Ganti ini kalau mau partisi lain, misal "system.img", "vendor.img"
+# (dipakai kalau unpack.py dijalanin langsung; output ke <base>/<partisi> dan <base>/config)
 img_path = os.path.join(base, "product.img")
 
-# Nama partisi = nama file tanpa .img (product.img -> "product")
-partition_name = os.path.splitext(os.path.basename(img_path))[0]
-
-# Folder extract & file config
-EXTRACT_DIR = os.path.join(base, partition_name)
-CONFIG_DIR = os.path.join(base, "config") 
+# Ukuran buffer copy per file (bytes); file gede di-stream per chunk, RAM tetap flat
+COPY_BUFFER_SIZE = 1 << 20
+# Copy extent langsung di kernel (copy_file_range / sendfile) kalau source-nya file image biasa
+KERNEL_COPY = True
+# Bagian file yang ga ke-map (hole / extent uninitialized) jadi hole juga di output, ga ditulis nol
+SPARSE_OUTPUT = True
+# Jumlah worker thread buat nulis isi file (1 = serial kayak dulu)
+JOBS = 1
+# Jumlah proses worker (0/1 = ga pakai multiprocess), tiap proses buka Volume sendiri
+PROCESSES = 0
+# Cache page hasil dekompres buat image .gz/.xz/.zst/.lz4 (bytes)
+IMAGE_CACHE_SIZE = 64 << 20
+# Tanpa mmap: inode table per group dibaca sekali jalan (sequential), bukan per inode.
+# Makan RAM (beberapa inode table terakhir disimpan), jadi default mati
+PREFETCH_INODE_TABLES = False
+# Scan berhenti kalau error satu run udah segini (multiprocess: total semua shard)
+MAX_ERRORS = 200
 
 
 # ====== HELPER ======
@@ -90,63 +115,269 @@ def get_perm_from_modestr(mode_str: str) -> str:
     return f'{s}{o}{g}{w}'
 
 
-fs_config = []
-file_contexts = []
-space_paths = []
-error_times = 0
-
-
-def scan_dir(root_inode, root_path: str = ""):
+class UnpackEntry:
     """
-    Port dari Extractor.scan_dir() di imgextractor.py,
-    disesuaikan untuk:
-    - path prefix = partition_name
-    - skip entry fs_config untuk lost+found root (biar ga ada product/lost+found)
+    Satu entry hasil Unpacker.iter_entries: metadata yang masuk fs_config / file_contexts,
+    plus path output-nya (target, None kalau ga di-extract / bukan file & folder).
     """
-    global error_times
-
-    for entry_name, entry_inode_idx, entry_type in root_inode.open_dir():
-        if entry_name in ('.', '..') or entry_name.endswith(' (2)'):
-            continue
 
-        if error_times >= 200:
-            print("Some thing wrong, stop scan!")
-            break
+    def __init__(self, path: str, fs_path: str, kind: str, size: int, uid: int, gid: int, mode: str,
+                 capabilities: str, link_target: str, label: str):
+        self.path = path                  # path di dalam partisi, mis. "/app/Photos.apk"
+        self.fs_path = fs_path            # path pakai prefix partisi (format fs_config), mis. "product/app/Photos.apk"
+        self.kind = kind                  # "dir", "file", "symlink", "other"
+        self.size = size
+        self.uid = uid
+        self.gid = gid
+        self.mode = mode                  # "0755"
+        self.capabilities = capabilities  # "0x..." atau None
+        self.link_target = link_target    # "" kalau bukan symlink
+        self.label = label                # security.selinux atau None
+        self.target = None
+
+    def __repr__(self):
+        return f"{type(self).__name__}(path={self.path!r}, kind={self.kind!r}, size={self.size})"
+
+
+class Unpacker:
+    """
+    Satu kali unpack image (atau satu partisi logical super.img). Semua opsi + state (folder output,
+    hasil fs_config/file_contexts, counter error, statistik) ada di object ini, ga ada global modul,
+    jadi beberapa Unpacker bisa jalan barengan di thread beda dalam satu proses.
+
+    extract_dir / config_dir : default <folder image>/<partisi> dan <folder image>/config
+    cache_size               : LRU cache block metadata (bytes, cuma kepake tanpa mmap)
+    prefetch_inode_tables    : tanpa mmap, baca inode table per group sekaligus (beberapa group terakhir di-cache)
+    image_cache_size         : cache page hasil dekompres buat image .gz/.xz/.zst/.lz4 (bytes)
+    include / exclude        : pola glob (fnmatch) path di dalam partisi, mis. "/app/*", "*.apk". Pola yang
+                               cocok sama folder berlaku buat semua isinya. exclude menang (folder-nya ga
+                               di-walk); kalau include diisi, cuma entry yang cocok yang diproses.
+    progress                 : callback(files_written, bytes_written) tiap ada file selesai ditulis
+                               (dipanggil dari thread worker kalau jobs > 1, per potongan kalau processes > 1)
+    """
 
-        entry_inode = root_inode.volume.get_inode(entry_inode_idx, entry_type)
-        entry_inode_path = root_path + '/' + entry_name
+    def __init__(self, img_path: str, partition: str = None, extract_dir: str = None, config_dir: str = None,
+                 use_mmap: bool = True, cache_size: int = 0, image_cache_size: int = IMAGE_CACHE_SIZE,
+                 prefetch_inode_tables: bool = PREFETCH_INODE_TABLES,
+                 buffer_size: int = COPY_BUFFER_SIZE, kernel_copy: bool = KERNEL_COPY, sparse: bool = SPARSE_OUTPUT,
+                 jobs: int = JOBS, processes: int = PROCESSES, include: list = None, exclude: list = None,
+                 progress=None, volume_class=ext4.Volume):
+        # === ROOT FOLDER = FOLDER TEMPAT IMAGE BERADA ===
+        root = os.path.dirname(img_path)
+
+        self.img_path = img_path
+        self.partition = partition
+        # system.img / system.img.xz -> "system"; partisi dari super.img pakai nama partisi logical-nya
+        self.partition_name = partition if partition else image_stem(img_path)
+
+        # === PATH OUTPUT EXT4 (IKUT EROFS) ===
+        self.extract_dir = extract_dir if extract_dir else os.path.join(root, self.partition_name)   # ROOT/<partition_name>/
+        self.config_dir = config_dir if config_dir else os.path.join(root, "config")                 # ROOT/config/
+
+        self.use_mmap = use_mmap
+        self.cache_size = cache_size
+        self.image_cache_size = image_cache_size
+        self.prefetch_inode_tables = prefetch_inode_tables
+        self.buffer_size = buffer_size
+        self.kernel_copy = kernel_copy
+        self.sparse = sparse
+        self.jobs = max(1, jobs)
+        self.processes = processes
+        self.include = list(include or [])
+        self.exclude = list(exclude or [])
+        self.progress = progress
+        self.volume_class = volume_class
+
+        # Volume terakhir yang dibuka (superblock-nya dipakai buat <partition>_info)
+        self.volume = None
+        self._stats_lock = threading.Lock()
+        self._reset()
+
+    def __repr__(self):
+        return f"{type(self).__name__}(img_path={self.img_path!r}, partition={self.partition!r}, extract_dir={self.extract_dir!r})"
+
+    def _reset(self):
+        self.fs_config = []
+        self.file_contexts = []
+        self.space_paths = []
+        self.error_times = 0
+
+        # Antrian job extract file (None = mode serial). Walker tetap satu thread,
+        # jadi urutan fs_config/file_contexts sama persis kayak serial.
+        self.file_jobs = None
+
+        # Statistik (worker extract nambahin barengan, makanya pakai lock)
+        self.files_written = 0
+        self.bytes_written = 0
+
+    def settings(self) -> dict:
+        """Opsi yang perlu dibawa ke proses shard (hasil & statistik mulai dari nol di sana)."""
+        return {
+            'img_path': self.img_path,
+            'partition': self.partition,
+            'extract_dir': self.extract_dir,
+            'config_dir': self.config_dir,
+            'use_mmap': self.use_mmap,
+            'cache_size': self.cache_size,
+            'image_cache_size': self.image_cache_size,
+            'prefetch_inode_tables': self.prefetch_inode_tables,
+            'buffer_size': self.buffer_size,
+            'kernel_copy': self.kernel_copy,
+            'sparse': self.sparse,
+            'include': self.include,
+            'exclude': self.exclude,
+            'volume_class': self.volume_class,
+        }
+
+    def add_written(self, files: int, byte_count: int):
+        with self._stats_lock:
+            self.files_written += files
+            self.bytes_written += byte_count
+            files_written, bytes_written = self.files_written, self.bytes_written
+        if self.progress is not None:
+            self.progress(files_written, bytes_written)
 
-        # Kalau path diakhiri slash tapi bukan dir => error
-        if entry_inode_path.endswith('/') and not entry_inode.is_dir:
-            error_times += 1
-            continue
+    # ====== BUKA IMAGE ======
 
-        # --- Permission & UID/GID ---
-        mode = get_perm_from_modestr(entry_inode.mode_str)
-        uid = entry_inode.inode.i_uid
-        gid = entry_inode.inode.i_gid
+    def open_volume(self, f):
+        """Volume dari image yang udah dibuka (open_image); partisi super.img dibaca langsung dari extent LP-nya."""
+        # mmap kalau bisa (file biasa), fallback otomatis ke stream
+        stream, offset = open_source(f, self.partition)
+        return self.volume_class(stream, offset=offset, use_mmap=self.use_mmap, cache_size=self.cache_size,
+                                 prefetch_inode_tables=self.prefetch_inode_tables)
+
+    @contextlib.contextmanager
+    def _open(self):
+        # sparse image (simg) dibaca langsung lewat index chunk, ga perlu simg2img / file sementara
+        with open_image(self.img_path, self.image_cache_size, save_index=True) as f:
+            # image kompres (gz/xz/zst/lz4) didekompres per unit sesuai kebutuhan, index-nya disimpan di <image>.seekidx
+            # (cuma pas unpack; --read / cek super image ga nulis apa-apa di samping image)
+            packed = f.stream if isinstance(f, SparseImage) else f
+            if isinstance(packed, CompressedImage):
+                print(f"[ZIMG] {packed.codec}, {packed.unit_count} unit, index {'cache' if packed.index_cached else 'baru'}")
+            if isinstance(f, SparseImage):
+                print(f"[SIMG] {f.chunk_count} chunk, {f.size} bytes")
+
+            # Volume cuma dibuka sekali; tipe EXT cuma buat info, engine-nya sama
+            vol = self.open_volume(f)
+            self.volume = vol
+            if self.partition is not None:
+                print(f"[SUPER] {self.partition} @ offset {vol.offset}" if vol.stream is f else f"[SUPER] {self.partition} ({vol.stream!r})")
+            fs_type, *_ = detect_type(vol.superblock)
+            print(f"[ENGINE] {fs_type}")
+            try:
+                yield vol
+            finally:
+                vol.close()
+
+            if vol.block_cache is not None:
+                c = vol.block_cache
+                print(f"[CACHE] hits={c.hits} misses={c.misses} evictions={c.evictions} "
+                      f"hit_rate={c.hit_rate:.1%} saved={c.bytes_saved // 1024} KiB")
+
+    # ====== JALANIN ======
+
+    def run(self):
+        """
+        Unpack penuh: folder output dibersihin dulu, semua entry di-extract, lalu config ditulis.
+        Return (fs_config_path, file_contexts_path, space_path, info_path).
+        """
+        self._reset()
+
+        # bersihkan folder lama (biar fresh)
+        if os.path.isdir(self.extract_dir):
+            shutil.rmtree(self.extract_dir)
+        os.makedirs(self.extract_dir, exist_ok=True)
+        os.makedirs(self.config_dir, exist_ok=True)
+
+        if self.processes > 1:
+            # tree dipecah per subtree ke beberapa proses, hasil config digabung urut
+            with self._open() as vol:
+                scan_sharded(self, vol)
+        else:
+            for entry in self.iter_entries(extract=True):
+                self.collect(entry)
+
+        return write_configs(self, self.volume)
+
+    def iter_entries(self, extract: bool = False):
+        """
+        Generator: walk image dan yield UnpackEntry per entry, urutan DFS (sama kayak fs_config),
+        filter include/exclude udah diterapin. extract=True: file/folder sekalian ditulis ke extract_dir
+        (jobs > 1: file di-yield pas masuk antrian, isinya ditulis nyusul sama worker).
+        Baris fs_config/file_contexts ga dikumpulin di sini (itu bagian run(), lewat collect()).
+        """
+        with self._open() as vol:
+            workers = []
+            if extract:
+                os.makedirs(self.extract_dir, exist_ok=True)
+                # jobs > 1: walker cuma antriin file, isi file ditulis paralel sama worker
+                if self.jobs > 1:
+                    self.file_jobs, workers = start_workers(self, self.jobs)
+            try:
+                yield from self.scan(ext4.walk(vol, vol.root), extract)
+            finally:
+                if workers:
+                    stop_workers(self.file_jobs, workers)
+                    self.file_jobs = None
+
+    def scan(self, entries, extract: bool = True):
+        """
+        Port dari Extractor.scan_dir() di imgextractor.py: proses entry hasil ext4.walk satu-satu.
+        Isi folder ga di-scan di sini; walk yang turun ke dalamnya (entry.descend = False buat skip).
+        Berhenti kalau error kebanyakan.
+        """
+        for entry in entries:
+            if entry.name.endswith(' (2)'):
+                entry.descend = False
+                continue
+
+            if self.error_times >= MAX_ERRORS:
+                print("Some thing wrong, stop scan!")
+                return
+
+            # Kalau path diakhiri slash tapi bukan dir => error
+            if entry.path.endswith('/') and not entry.is_dir:
+                self.error_times += 1
+                continue
+
+            if (self.include or self.exclude) and not self.wanted(entry):
+                continue
+
+            record = self.describe(entry)
+            if extract:
+                self.extract_entry(record, entry.inode)
+            yield record
+
+    # ====== FILTER ======
+
+    def wanted(self, entry) -> bool:
+        """Cek include/exclude; folder yang ke-exclude sekalian ga di-walk isinya."""
+        if self.exclude and _match_path(entry.path, self.exclude):
+            entry.descend = False
+            return False
+        # folder yang ga cocok include tetap di-walk, isinya bisa aja cocok
+        return not self.include or _match_path(entry.path, self.include)
+
+    # ====== PER ENTRY ======
+
+    def describe(self, entry) -> UnpackEntry:
+        """Permission, UID/GID, capability, SELinux label satu entry (format imgextractor)."""
+        entry_inode = entry.inode
 
-        cap = ''
-        link_target = ''
         # tmp_path = FileName + entry_inode_path (FileName = partition_name)
         # tmp_path harus mengandung prefix partition seperti imgextractor:
         # contoh -> "system_ext/apex/com.android...": (FileName + entry_path)
-        tmp_path = partition_name + entry_inode_path   # contoh: product + "/app/..." -> "product/app/..."
+        tmp_path = self.partition_name + entry.path   # contoh: product + "/app/..." -> "product/app/..."
         # pastikan tidak ada double-slash: kalau entry_inode_path sudah ada prefix yang aneh, normalize:
         tmp_path = tmp_path.lstrip('/')   # remove leading slash so later we add one when writing
 
         # --- XATTR (SELINUX & CAP) ---
-        for fname, val in entry_inode.xattrs():
+        label = None
+        cap_val = None
+        for fname, val in entry.xattrs:
             if fname == "security.selinux":
-                ctx = val.decode("utf8", errors="ignore").rstrip("\x00").rstrip()
-
-                # Escape special chars (MIO-Kitchen behavior)
-                esc = tmp_path
-                for ch in "\\^$.|?*+(){}[]":
-                    esc = esc.replace(ch, "\\" + ch)
-
-                # prepend "/" → /lost+found , /app/Photos.apk, ...
-                file_contexts.append(f"/{esc} {ctx}")
+                label = val.decode("utf8", errors="ignore").rstrip("\x00").rstrip()
 
             elif fname == 'security.capability':
                 r = struct.unpack('<5I', val)
@@ -154,217 +385,443 @@ def scan_dir(root_inode, root_path: str = ""):
                     cap_val = hex(int(f'{r[3]:04x}{r[1]:04x}', 16))
                 else:
                     cap_val = hex(int(f'{r[3]:04x}{r[2]:04x}{r[1]:04x}', 16))
-                cap = f" capabilities={cap_val}"
 
-        # --- symlink target (kalau symlink) ---
-        if entry_inode.is_symlink:
-            try:
-                link_target = entry_inode.open_read().read().decode("utf8")
-            except Exception:
-                link_target_block = int.from_bytes(entry_inode.open_read().read(), "little")
-                link_target = root_inode.volume.read(
-                    link_target_block * root_inode.volume.block_size,
-                    entry_inode.inode.i_size
-                ).decode("utf8", errors="ignore")
+        if entry_inode.is_dir:
+            kind = "dir"
+        elif entry_inode.is_file:
+            kind = "file"
+        elif entry_inode.is_symlink:
+            kind = "symlink"
+        else:
+            kind = "other"
+
+        return UnpackEntry(entry.path, tmp_path, kind, entry_inode.size, entry.uid, entry.gid,
+                           get_perm_from_modestr(entry.mode_str), cap_val, entry.link_target or '', label)
+
+    def collect(self, record: UnpackEntry):
+        """Tambahin baris fs_config / file_contexts / space path buat satu entry."""
+        tmp_path = record.fs_path
+
+        if record.label is not None:
+            # Escape special chars (MIO-Kitchen behavior)
+            esc = tmp_path
+            for ch in "\\^$.|?*+(){}[]":
+                esc = esc.replace(ch, "\\" + ch)
+
+            # prepend "/" → /lost+found , /app/Photos.apk, ...
+            self.file_contexts.append(f"/{esc} {record.label}")
 
         # --- FS_CONFIG entry path handling (spasi) + SKIP product/lost+found ---
-        # lost+found root: root_path == "" dan entry_name == "lost+found"
+        # lost+found root: path == "/lost+found"
         # => JANGAN bikin "product/lost+found" di fs_config, tapi context tetap jalan.
-        skip_fs_entry = (root_path == "" and entry_name == "lost+found")
+        if record.path == "/lost+found":
+            return
 
-        if not skip_fs_entry:
-            if tmp_path.find(' ', 1, len(tmp_path)) > 0:
-                space_paths.append(tmp_path)
-                out_path = tmp_path.replace(' ', '_')
-            else:
-                out_path = tmp_path
+        if tmp_path.find(' ', 1, len(tmp_path)) > 0:
+            self.space_paths.append(tmp_path)
+            out_path = tmp_path.replace(' ', '_')
+        else:
+            out_path = tmp_path
 
-            # Append ke fs_config persis format kitchen:
-            # path uid gid mode[ cap] linktarget
-            fs_config.append(f"{out_path} {uid} {gid} {mode}{cap} {link_target}")
+        cap = f" capabilities={record.capabilities}" if record.capabilities else ''
 
-        # --- Extract file/folder ke EXTRACT_DIR (tetep sama kayak sebelumnya) ---
-        if entry_inode.is_dir:
-            dir_target = os.path.join(EXTRACT_DIR, entry_inode_path.lstrip('/').replace(' ', '_').replace('"', ''))
+        # Append ke fs_config persis format kitchen:
+        # path uid gid mode[ cap] linktarget
+        self.fs_config.append(f"{out_path} {record.uid} {record.gid} {record.mode}{cap} {record.link_target}")
+
+    def extract_entry(self, record: UnpackEntry, entry_inode):
+        """Extract file/folder ke extract_dir (symlink dilewati)."""
+        if record.kind == "dir":
+            dir_target = os.path.join(self.extract_dir, record.path.lstrip('/').replace(' ', '_').replace('"', ''))
             if dir_target.endswith('.') and os.name == 'nt':
                 dir_target = dir_target[:-1]
             if not os.path.isdir(dir_target):
                 os.makedirs(dir_target, exist_ok=True)
+            record.target = dir_target
 
-            scan_dir(entry_inode, entry_inode_path)
-
-        elif entry_inode.is_file:
-            file_target = os.path.join(EXTRACT_DIR, entry_inode_path.lstrip('/').replace(' ', '_').replace('"', ''))
+        elif record.kind == "file":
+            file_target = os.path.join(self.extract_dir, record.path.lstrip('/').replace(' ', '_').replace('"', ''))
             file_target_dir = os.path.dirname(file_target)
             if not os.path.exists(file_target_dir):
                 os.makedirs(file_target_dir, exist_ok=True)
-            try:
-                with open(file_target, 'wb') as out:
-                    out.write(entry_inode.open_read().read())
-            except Exception as e:
-                print(f"[E] Cannot write to {file_target}: {e}")
+            record.target = file_target
 
-        elif entry_inode.is_symlink:
-            # Di Windows nggak ada symlink native, tapi kita skip aja untuk sekarang
-            target = os.path.join(EXTRACT_DIR, entry_inode_path.lstrip('/').replace(' ', '_'))
-            # Kalau mau bener-bener copy behaviour symlink, perlu posix.symlink;
-            # tapi di Windows ga wajib buat tool config.
-
-def main(img_path: str):
-    global Volume
-    import os
-    import shutil
-    from check import detect_type
-
-    # === ROOT FOLDER = FOLDER TEMPAT IMAGE BERADA ===
-    root = os.path.dirname(img_path)
-
-    partition_name = os.path.splitext(os.path.basename(img_path))[0]
-
-    # === PATH OUTPUT EXT4 (IKUT EROFS) ===
-    part_dir = os.path.join(root, partition_name)   # <-- ROOT/<partition_name>/
-    config_dir = os.path.join(root, "config")       # <-- ROOT/config/
-
-    # reset global state
-    global fs_config, file_contexts, space_paths, error_times
-    fs_config.clear()
-    file_contexts.clear()
-    space_paths.clear()
-    error_times = 0
-
-    # bersihkan folder lama (biar fresh)
-    if os.path.isdir(part_dir):
-        shutil.rmtree(part_dir)
-    os.makedirs(part_dir, exist_ok=True)
-
-    os.makedirs(config_dir, exist_ok=True)
-
-    # === OVERRIDE EXTRACT_DIR GLOBAL ===
-    # sekarang semua output dari scan_dir akan masuk ke folder ini
-    globals()['EXTRACT_DIR'] = part_dir
-    globals()['CONFIG_DIR']  = config_dir
-    globals()['partition_name'] = partition_name
+            if self.file_jobs is not None:
+                self.file_jobs.put((entry_inode, file_target))
+            else:
+                self.extract_file(entry_inode, file_target)
+
+        # symlink: di Windows nggak ada symlink native, skip aja untuk sekarang
+        # (kalau mau bener-bener copy behaviour symlink, perlu posix.symlink; buat tool config ga wajib)
+
+    def copy_stream(self, reader, out):
+        """
+        Copy isi file dari reader (ext4.BlockReader / BytesIO) ke out per chunk,
+        jadi file segede apapun ga pernah dibaca utuh ke memory.
+        """
+        if hasattr(reader, "copy_to"):
+            return reader.copy_to(out, self.buffer_size, kernel_copy=self.kernel_copy, sparse=self.sparse)
+        shutil.copyfileobj(reader, out, self.buffer_size)
+
+    def extract_file(self, entry_inode, file_target: str):
+        try:
+            with open(file_target, 'wb') as out:
+                self.copy_stream(entry_inode.open_read(), out)
+                byte_count = out.tell()
+        except Exception as e:
+            print(f"[E] Cannot write to {file_target}: {e}")
+            return
+        self.add_written(1, byte_count)
+
+
+def _match_path(path: str, patterns: list) -> bool:
+    # path sendiri atau salah satu folder induknya cocok sama salah satu pola
+    while path:
+        if any(fnmatch.fnmatchcase(path, pattern) for pattern in patterns):
+            return True
+        path = path.rpartition('/')[0]
+    return False
+
+
+def extract_worker(unpacker: Unpacker, jobs):
+    while True:
+        job = jobs.get()
+        if job is None:
+            break
+        unpacker.extract_file(*job)
 
-    # ====== BUKA IMAGE ======
-    with open(img_path, "rb") as f:
-        # pakai ext4 dulu buat baca superblock
-        tmp_vol = ext4.Volume(f)
-        fs_type, *_ = detect_type(tmp_vol.superblock)
-
-        # reset file pointer
-        f.seek(0)
-
-        if fs_type == "EXT2":
-            Volume = ext2.Volume
-        elif fs_type == "EXT3":
-            Volume = ext3.Volume
-        else:
-            Volume = ext4.Volume
 
-        print(f"[ENGINE] Volume = {Volume.__module__}")
+def start_workers(unpacker: Unpacker, count: int):
+    """Nyalain worker pool; return (queue, threads)."""
+    jobs = queue.Queue(maxsize=count * 64)   # dibatesin biar walker ga kejauhan di depan
+    threads = [threading.Thread(target=extract_worker, args=(unpacker, jobs), daemon=True) for _ in range(count)]
+    for t in threads:
+        t.start()
+    return jobs, threads
 
-        vol = Volume(f)
-        root_inode = vol.root
-        scan_dir(root_inode)
 
+def stop_workers(jobs, threads):
+    for _ in threads:
+        jobs.put(None)
+    for t in threads:
+        t.join()
 
-    # ====== WRITE FS_CONFIG HEADER ======
-    fs_config.insert(0, '/ 0 0 0755')
-    fs_config.insert(1, f'{partition_name} 0 0 0755')
-    fs_config.insert(2, f'{partition_name}/lost+found 0 0 0700')
 
-    # ====== FILE_CONTEXTS HEADER — enforce exact format like imgextractor ======
-    if file_contexts:
-        file_contexts.sort()
+# ====== MULTIPROCESS (shard per subtree) ======
 
-        # ambil representative SELinux label dari entry pertama, fallback aman
-        first_parts = file_contexts[0].split()
-        sel_label = first_parts[1] if len(first_parts) > 1 else "u:object_r:system_file:s0"
+_shard_image = None
+_shard_volume = None
+_shard_unpacker = None
 
-        # headers dalam urutan yang LU MAU:
-        headers = [
-            f"/ {sel_label}",
-            f"/{partition_name}(/.*)? {sel_label}",
-            f"/{partition_name} {sel_label}",
-            f"/{partition_name}/lost+\\found {sel_label}",
-        ]
 
-        # insert headers at top preserving desired order (insert reversed)
-        for h in reversed(headers):
-            if h not in file_contexts:
-                file_contexts.insert(0, h)
+def plan_shards(volume, processes: int, max_depth: int = 3):
+    """
+    Pecah tree jadi unit (root_path, name, inode_idx, type, recurse), urut persis kayak scan_dir (DFS).
+    Folder di level atas dipecah (recurse=False, isinya jadi unit sendiri) sampai subtree-nya
+    cukup banyak buat dibagi ke semua proses. Hasil unit digabung urut -> output sama kayak serial.
+    Tiap level cuma mecah unit folder dari level sebelumnya, jadi tiap folder di-list sekali aja.
+    """
+    # (unit, inode folder yang masih bisa dipecah / None)
+    plan = _plan_dir(volume, volume.root, "")
+    for _ in range(max_depth):
+        if sum(1 for unit, _ in plan if unit[4]) >= processes * 8:
+            break
 
-        # keep legacy kitchen special-case for build.prop if it exists
-        # (insert after headers, exactly like extractor)
-        for c in list(file_contexts):
-            if re.search(r'/system/system/build..prop\s', c):
-                # insert lost+found and the "double partition" pattern used by kitchen
-                if '/lost+\\found u:object_r:rootfs:s0' not in file_contexts:
-                    file_contexts.insert(3, '/lost+\\found u:object_r:rootfs:s0')
-                dbl = f'/{partition_name}/{partition_name}/(/.*)? {sel_label}'
-                if dbl not in file_contexts:
-                    file_contexts.insert(4, dbl)
+        expanded = []
+        for unit, dir_inode in plan:
+            if dir_inode is None:
+                expanded.append((unit, None))
+                continue
+            root_path, entry_name, entry_inode_idx, entry_type, _ = unit
+            expanded.append(((root_path, entry_name, entry_inode_idx, entry_type, False), None))
+            expanded.extend(_plan_dir(volume, dir_inode, root_path + '/' + entry_name))
+        plan = expanded
+
+    return [unit for unit, _ in plan]
+
+
+def _plan_dir(volume, dir_inode, root_path: str) -> list:
+    plan = []
+    for entry_name, entry_inode_idx, entry_type in dir_inode.open_dir():
+        if entry_name in ('.', '..') or entry_name.endswith(' (2)'):
+            continue
+
+        entry_inode = volume.get_inode(entry_inode_idx, entry_type)
+        plan.append(((root_path, entry_name, entry_inode_idx, entry_type, True), entry_inode if entry_inode.is_dir else None))
+    return plan
+
+
+def _init_shard_worker(settings: dict):
+    """Initializer proses worker: Unpacker dari opsi parent + buka Volume sendiri (ditutup pas worker keluar)."""
+    global _shard_image, _shard_volume, _shard_unpacker
+    _shard_unpacker = Unpacker(**settings)
+    _shard_image = open_image(_shard_unpacker.img_path, _shard_unpacker.image_cache_size)
+    _shard_volume = _shard_unpacker.open_volume(_shard_image)
+    # worker multiprocessing keluar lewat os._exit (atexit ga jalan), finalizer ini tetap dipanggil
+    multiprocessing.util.Finalize(None, _close_shard_worker, exitpriority=10)
+
+
+def _close_shard_worker():
+    global _shard_image, _shard_volume
+    if _shard_volume is not None:
+        _shard_volume.close()
+        _shard_volume = None
+    if _shard_image is not None:
+        _shard_image.close()
+        _shard_image = None
+
+
+def _walk_unit(volume, unit):
+    # entry unit-nya dulu, baru isinya (kalau unit-nya folder yang di-recurse dan ga di-skip)
+    root_path, entry_name, entry_inode_idx, entry_type, recurse = unit
+    entry = ext4.WalkEntry.from_dirent(volume, root_path, entry_name, entry_inode_idx, entry_type)
+    yield entry
+    if recurse and entry.descend and entry.is_dir:
+        yield from ext4.walk(volume, entry.inode, entry.path)
+
+
+def _scan_shard(units: list, error_times: int):
+    """
+    Jalanin scan buat sepotong unit (urut). error_times = total error run yang udah diketahui parent,
+    jadi batas MAX_ERRORS tetap kehitung per run, bukan per unit.
+    Return potongan (fs_config, file_contexts, space_paths, files_written, bytes_written, error baru).
+    """
+    unpacker = _shard_unpacker
+    # cuma potongan hasil yang di-reset; counter error lanjut dari total run
+    unpacker.fs_config, unpacker.file_contexts, unpacker.space_paths = [], [], []
+    unpacker.files_written = unpacker.bytes_written = 0
+    unpacker.error_times = error_times
+
+    for unit in units:
+        if unpacker.error_times >= MAX_ERRORS:
+            break
+        for record in unpacker.scan(_walk_unit(_shard_volume, unit)):
+            unpacker.collect(record)
+
+    return (unpacker.fs_config, unpacker.file_contexts, unpacker.space_paths,
+            unpacker.files_written, unpacker.bytes_written, unpacker.error_times - error_times)
+
+
+def scan_sharded(unpacker: Unpacker, volume):
+    """
+    Bagi unit ke proses worker sepotong-sepotong (maksimal beberapa potongan jalan di depan),
+    hasilnya digabung urut. Begitu total error run nyampe MAX_ERRORS, potongan berikutnya ga dikasih lagi.
+    """
+    processes = unpacker.processes
+    units = plan_shards(volume, processes)
+    print(f"[SHARD] {len(units)} unit -> {processes} proses")
+
+    chunksize = max(1, len(units) // (processes * 16))
+    chunks = [units[i:i + chunksize] for i in range(0, len(units), chunksize)]
+
+    with ProcessPoolExecutor(max_workers=processes, initializer=_init_shard_worker,
+                             initargs=(unpacker.settings(),)) as pool:
+        pending = collections.deque()
+        next_chunk = 0
+        while pending or next_chunk < len(chunks):
+            while next_chunk < len(chunks) and len(pending) < processes * 2 and unpacker.error_times < MAX_ERRORS:
+                pending.append(pool.submit(_scan_shard, chunks[next_chunk], unpacker.error_times))
+                next_chunk += 1
+            if not pending:
+                print("Some thing wrong, stop scan!")
                 break
 
-    # 4. Tulis file hasil ke CONFIG_DIR
-    fs_config_path = os.path.join(CONFIG_DIR, f"{partition_name}_fs_config")
-    file_contexts_path = os.path.join(CONFIG_DIR, f"{partition_name}_file_contexts")
-    space_path = os.path.join(CONFIG_DIR, f"{partition_name}_space.txt")
+            frag_fs_config, frag_file_contexts, frag_space_paths, files, byte_count, errors = pending.popleft().result()
+            unpacker.fs_config.extend(frag_fs_config)
+            unpacker.file_contexts.extend(frag_file_contexts)
+            unpacker.space_paths.extend(frag_space_paths)
+            unpacker.error_times += errors
+            unpacker.add_written(files, byte_count)
 
-    with open(fs_config_path, "w", newline="\n", encoding="utf-8") as fcfg:
-        fcfg.write("\n".join(fs_config))
 
-    if file_contexts:
-        with open(file_contexts_path, "w", newline="\n", encoding="utf-8") as fctx:
-            fctx.write("\n".join(file_contexts))
+def open_source(f, partition: str = None):
+    """
+    (stream, offset) buat Volume. partition = nama partisi logical di super.img: dibaca langsung dari
+    extent LP-nya (satu extent linear = offset doang di file super, tetap bisa mmap / kernel copy).
+    """
+    if partition is None:
+        return f, 0
+    return LpMetadata(f).get_partition(partition).open(f)
 
-    if space_paths:
-        with open(space_path, "w", newline="\n", encoding="utf-8") as fsp:
-            fsp.write("\n".join(space_paths))
 
-    # ====== BUILD <partition_name>_info ======
-    fmt, journal, extents, *_ = detect_type(vol.superblock)
-    filesystem_size = vol.superblock.s_blocks_count * vol.block_size
-    block_size = vol.block_size  # <--- ambil block size ext4 asli
+def is_super_image(img_path: str) -> bool:
+    """
+    Cek magic geometry LP (offset 4096) dari header image aja. Image kompres cuma didekompres bagian depannya
+    (ga bikin index .seekidx); wrapper penuh cuma dibuka buat sparse image, yang offset-nya harus lewat chunk.
+    """
+    head = read_image_head(img_path, LpMetadata.RESERVED_BYTES + 4)
+    if SparseImage.is_sparse(io.BytesIO(head)):
+        with open_image(img_path) as f:
+            return LpMetadata.is_super(f)
+    return LpMetadata.is_super(io.BytesIO(head))
+
+
+def list_super_partitions(img_path: str) -> list:
+    """
+    Nama partisi logical di super.img yang isinya filesystem EXT (partisi kosong / non-EXT dilewati).
+    Cuma dipanggil sebelum unpack, jadi index .seekidx image kompres langsung disimpan buat dipakai unpack-nya.
+    """
+    names = []
+    with open_image(img_path, save_index=True) as f:
+        for partition in LpMetadata(f).partitions:
+            if partition.size < 0x43A:
+                continue
+            stream, offset = partition.open(f)
+            stream.seek(offset + 0x438)
+            if stream.read(2) == b"\x53\xef":
+                names.append(partition.name)
+    return names
+
+
+def main_super(img_path: str, partitions: list = None, workers: int = 1, **options):
+    """
+    Unpack partisi logical langsung dari super.img (tanpa lpunpack / file perantara).
+    partitions kosong = semua partisi EXT. workers > 1: partisi di-unpack barengan (thread, context
+    sendiri-sendiri). Return [(nama, (ok, out_dir)), ...].
+    """
+    if not is_super_image(img_path):
+        raise ValueError(f"{img_path} bukan super image (dynamic partitions)")
+    results = unpack_batch([img_path], workers, partitions, **options)
+    return [(result["partition"], (result["ok"], result["out_dir"])) for result in results]
+
+
+def unpack_image(img_path: str, partition: str = None, **options) -> Unpacker:
+    """
+    Unpack satu image (atau satu partisi logical super.img) + tulis config-nya.
+    Opsi = parameter Unpacker; return Unpacker-nya (folder output, statistik).
+    """
+    unpacker = Unpacker(img_path, partition=partition, **options)
+    unpacker.run()
+    return unpacker
+
+
+def main(img_path: str, use_mmap: bool = True, cache_size: int = 0, buffer_size: int = 1 << 20,
+         kernel_copy: bool = True, sparse: bool = True, jobs: int = 1, processes: int = 0, partition: str = None,
+         include: list = None, exclude: list = None, prefetch_inode_tables: bool = PREFETCH_INODE_TABLES):
+    unpacker = unpack_image(img_path, partition, use_mmap=use_mmap, cache_size=cache_size, buffer_size=buffer_size,
+                            kernel_copy=kernel_copy, sparse=sparse, jobs=jobs, processes=processes,
+                            include=include, exclude=exclude, prefetch_inode_tables=prefetch_inode_tables)
 
-    info_path = os.path.join(CONFIG_DIR, f"{partition_name}_info")
-    with open(info_path, "w", encoding="utf-8", newline="\n") as finfo:
-        finfo.write(f"PartitionName: {partition_name}\n")
-        finfo.write(f"Format: {fmt}\n")
-        finfo.write(f"Size: {filesystem_size}\n")
-        finfo.write(f"BlockSize: {block_size}\n")
-        finfo.write(f"BlockCount: {vol.get_block_count}\n")
-        finfo.write(f"FreeBlocks: {vol.get_free_blocks_count}\n")
-        finfo.write(f"MountPoint: {vol.get_mount_point}\n")
-        finfo.write(f"VolumeName: {vol.superblock.s_volume_name.decode('utf-8', errors='ignore').rstrip(chr(0))}\n")
-        finfo.write(f"UUID: {vol.uuid}\n")
-        
     # === RETURN KE GUI ===
-    return True, part_dir
+    return True, unpacker.extract_dir
 
-# ===================== MAIN =====================
 
-if __name__ == "__main__":
-    print(f"[*] Image  : {img_path}")
-    print(f"[*] Mount  : /{partition_name}")
-    print(f"[*] Output : {EXTRACT_DIR}")
-    print(f"[*] Config : {CONFIG_DIR}")
-    print("=================================")
+# ====== BATCH (banyak image sekaligus, satu proses) ======
+
+IMAGE_PATTERNS = ("*.img", "*.img.gz", "*.img.xz", "*.img.zst", "*.img.zstd", "*.img.lz4")
+
+
+def collect_images(sources: list) -> list:
+    """
+    Kumpulin path image dari list file / folder / glob. Folder = semua *.img (plus versi kompresnya)
+    di dalamnya. Urutan ikut input, duplikat dibuang.
+    """
+    images = []
+    for source in sources:
+        if os.path.isdir(source):
+            found = [path for pattern in IMAGE_PATTERNS for path in glob.glob(os.path.join(source, pattern))]
+        elif os.path.isfile(source):
+            found = [source]
+        else:
+            found = glob.glob(source)
+
+        for path in sorted(found):
+            path = os.path.abspath(path)
+            if path not in images:
+                images.append(path)
+    return images
 
-    os.makedirs(EXTRACT_DIR, exist_ok=True)
-    os.makedirs(CONFIG_DIR, exist_ok=True)
 
-    with open(img_path, "rb") as f:
-        vol = Volume(f)
-        root = vol.root
+def _unpack_task(unpacker: Unpacker) -> dict:
+    result = {"image": unpacker.img_path, "partition": unpacker.partition, "ok": False, "out_dir": unpacker.extract_dir,
+              "files": 0, "bytes": 0, "seconds": 0.0, "error": None}
+    start = time.perf_counter()
+    try:
+        unpacker.run()
+        result.update(ok=True, files=unpacker.files_written, bytes=unpacker.bytes_written)
+    except Exception as e:
+        result["error"] = str(e)
+        print(f"[ERR] {_task_name(result)}: {e}")
+    result["seconds"] = time.perf_counter() - start
+    return result
+
+
+def _task_name(result: dict) -> str:
+    name = os.path.basename(result["image"])
+    return f"{name}:{result['partition']}" if result["partition"] else name
 
-        # 1. Extract isi EXT4 + kumpulin metadata (fs_config + context)
-        scan_dir(root)
 
-    # 2. FS_CONFIG HEADER SIMPLE:
-    # /                     0 0 0755
-    # <partition_name>      0 0 0755
-    # <partition_name>/lost+found 0 0 0700
+def unpack_batch(images: list, workers: int = 2, partitions: list = None, **options) -> list:
+    """
+    Unpack banyak image barengan dalam satu proses, maksimal `workers` sekaligus (thread pool).
+    Tiap task punya Unpacker sendiri (options = parameter Unpacker). super.img dipecah jadi satu task per partisi logical
+    (partitions = filter nama partisi). Task yang folder output-nya sama dengan task sebelumnya
+    (mis. system.img + system.img.xz satu folder) ga dijalanin. Return list hasil per task.
+    """
+    tasks = []
+    for img_path in images:
+        if is_super_image(img_path):
+            names = list(partitions) if partitions else list_super_partitions(img_path)
+            print(f"[SUPER] {os.path.basename(img_path)}: {len(names)} partisi: {', '.join(names)}")
+            tasks.extend(Unpacker(img_path, partition=name, **options) for name in names)
+        else:
+            tasks.append(Unpacker(img_path, **options))
+
+    results = [None] * len(tasks)
+    runnable = []
+    outputs = {}
+    for task_idx, unpacker in enumerate(tasks):
+        out_dir = os.path.abspath(unpacker.extract_dir)
+        if out_dir in outputs:
+            results[task_idx] = {"image": unpacker.img_path, "partition": unpacker.partition, "ok": False,
+                                 "out_dir": unpacker.extract_dir, "files": 0, "bytes": 0, "seconds": 0.0,
+                                 "error": f"output sama dengan {os.path.basename(outputs[out_dir])}"}
+            print(f"[ERR] {_task_name(results[task_idx])}: {results[task_idx]['error']}, dilewati")
+            continue
+        outputs[out_dir] = unpacker.img_path
+        runnable.append(task_idx)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        futures = {task_idx: pool.submit(_unpack_task, tasks[task_idx]) for task_idx in runnable}
+        for task_idx, future in futures.items():
+            results[task_idx] = future.result()
+
+    print_batch_summary(results, time.perf_counter() - start)
+    return results
+
+
+def print_batch_summary(results: list, seconds: float):
+    """Tabel ringkasan: waktu, jumlah file, data yang ditulis + throughput per image dan total."""
+    header = f"{'IMAGE':<32} {'STATUS':<6} {'FILES':>7} {'MiB':>9} {'DETIK':>8} {'MiB/s':>8}"
+    print("=" * len(header))
+    print(header)
+    print("-" * len(header))
+
+    for result in results:
+        mib = result["bytes"] / (1 << 20)
+        rate = mib / result["seconds"] if result["seconds"] > 0 else 0.0
+        status = "OK" if result["ok"] else "ERR"
+        print(f"{_task_name(result)[:32]:<32} {status:<6} {result['files']:>7} {mib:>9.1f} {result['seconds']:>8.2f} {rate:>8.1f}")
+
+    ok_count = sum(1 for result in results if result["ok"])
+    total_files = sum(result["files"] for result in results)
+    total_mib = sum(result["bytes"] for result in results) / (1 << 20)
+    total_rate = total_mib / seconds if seconds > 0 else 0.0
+    print("-" * len(header))
+    print(f"{'TOTAL (wall)':<32} {f'{ok_count}/{len(results)}':<6} {total_files:>7} {total_mib:>9.1f} {seconds:>8.2f} {total_rate:>8.1f}")
+    print("=" * len(header))
+
+
+def write_configs(unpacker: Unpacker, vol):
+    """Tulis <partition>_fs_config, _file_contexts, _space.txt, _info ke unpacker.config_dir; return path-nya."""
+    fs_config = unpacker.fs_config
+    file_contexts = unpacker.file_contexts
+    space_paths = unpacker.space_paths
+    partition_name = unpacker.partition_name
+    config_dir = unpacker.config_dir
+
+    # ====== WRITE FS_CONFIG HEADER ======
     fs_config.insert(0, '/ 0 0 0755')
     fs_config.insert(1, f'{partition_name} 0 0 0755')
     fs_config.insert(2, f'{partition_name}/lost+found 0 0 0700')
@@ -402,10 +859,10 @@ if __name__ == "__main__":
                     file_contexts.insert(4, dbl)
                 break
 
-    # 4. Tulis file hasil ke CONFIG_DIR
-    fs_config_path = os.path.join(CONFIG_DIR, f"{partition_name}_fs_config")
-    file_contexts_path = os.path.join(CONFIG_DIR, f"{partition_name}_file_contexts")
-    space_path = os.path.join(CONFIG_DIR, f"{partition_name}_space.txt")
+    # 4. Tulis file hasil ke config_dir
+    fs_config_path = os.path.join(config_dir, f"{partition_name}_fs_config")
+    file_contexts_path = os.path.join(config_dir, f"{partition_name}_file_contexts")
+    space_path = os.path.join(config_dir, f"{partition_name}_space.txt")
 
     with open(fs_config_path, "w", newline="\n", encoding="utf-8") as fcfg:
         fcfg.write("\n".join(fs_config))
@@ -423,7 +880,7 @@ if __name__ == "__main__":
     filesystem_size = vol.superblock.s_blocks_count * vol.block_size
     block_size = vol.block_size  # <--- ambil block size ext4 asli
 
-    info_path = os.path.join(CONFIG_DIR, f"{partition_name}_info")
+    info_path = os.path.join(config_dir, f"{partition_name}_info")
     with open(info_path, "w", encoding="utf-8", newline="\n") as finfo:
         finfo.write(f"PartitionName: {partition_name}\n")
         finfo.write(f"Format: {fmt}\n")
@@ -435,10 +892,28 @@ if __name__ == "__main__":
         finfo.write(f"VolumeName: {vol.superblock.s_volume_name.decode('utf-8', errors='ignore').rstrip(chr(0))}\n")
         finfo.write(f"UUID: {vol.uuid}\n")
 
+    return fs_config_path, file_contexts_path, space_path, info_path
+
+
+# ===================== MAIN =====================
+
+if __name__ == "__main__":
+    unpacker = Unpacker(img_path)
+
+    print(f"[*] Image  : {img_path}")
+    print(f"[*] Mount  : /{unpacker.partition_name}")
+    print(f"[*] Output : {unpacker.extract_dir}")
+    print(f"[*] Config : {unpacker.config_dir}")
+    print("=================================")
+
+    # 1. Extract isi EXT4 + kumpulin metadata (fs_config + context)
+    # 2. Header fs_config / file_contexts + tulis semua config ke config_dir
+    fs_config_path, file_contexts_path, space_path, info_path = unpacker.run()
+
     print("📄 info           ->", info_path)
     print("=================================")
     print("📄 fs_config      ->", fs_config_path)
     print("📄 file_contexts  ->", file_contexts_path)
-    if space_paths:
+    if unpacker.space_paths:
         print("📄 space paths    ->", space_path)
-    print("📂 extracted dir  ->", EXTRACT_DIR)
+    print("📂 extracted dir  ->", unpacker.extract_dir)